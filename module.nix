@@ -130,6 +130,7 @@ in
           example = "secrets/key.json";
           description = mdDoc "Path to GCS credentials file.";
         };
+        bundle = mkEnableOption "uploading results to GCS as single tar archive";
       };
 
       timeout = {
@@ -269,7 +270,7 @@ in
           ${if cfg.store-debug-log then "--store-debug-log" else "--no-store-debug-log"} \
           ${if cfg.record-addr-data then "--record-addr-data" else "--no-record-addr-data"} \
           ${if cfg.gcs.enable
-then "--store-to-gcs ${optionalString (cfg.gcs.bucket != null) "--gcs-bucket ${cfg.gcs.bucket}"} ${optionalString (cfg.gcs.location != null) "--gcs-location ${cfg.gcs.location}"} ${optionalString (cfg.gcs.credentials != null) "--gcs-credentials ${cfg.gcs.credentials}"}"
+then "--store-to-gcs ${optionalString (cfg.gcs.bucket != null) "--gcs-bucket ${cfg.gcs.bucket}"} ${optionalString (cfg.gcs.location != null) "--gcs-location ${cfg.gcs.location}"} ${optionalString (cfg.gcs.credentials != null) "--gcs-credentials ${cfg.gcs.credentials}"} ${if cfg.gcs.bundle then "--gcs-bundle" else "--no-gcs-bundle"}"
 else "--no-store-to-gcs"} \
           ${optionalString (cfg.timestamp != null) "--timestamp=${cfg.timestamp}" } \
           ${optionalString (cfg.tor.enable != false) "--tor-proxy-host=${cfg.tor.proxy-host} --tor-proxy-port=${toString cfg.tor.proxy-port}" } \
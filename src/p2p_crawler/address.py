@@ -1,54 +1,93 @@
 """This module contains the 'Address' and 'Socket' classes that handle network connections."""
 import logging as log
+import re
 import time
-from dataclasses import dataclass
-from functools import cached_property
+from dataclasses import dataclass, field
 from typing import ClassVar, Tuple
 
 import mmh3
 
 DEFAULT_MAINNET_PORT = 8333
-TOR_V2_ADDR_LEN = 16 + len(".onion")
-TOR_V3_ADDR_LEN = 56 + len(".onion")
-I2P_ADDR_LEN = 52 + len(".b32.i2p")
-CJDNS_PREFIX = "fc"
-
 
+# Network types are determined with a single regex match. Alternatives are
+# tried in order, so CJDNS (IPv6 addresses starting with "fc") takes
+# precedence over IPv6. Onion and I2P addresses are identified by their
+# suffix and base32-encoded length (16 for Onion v2, 56 for Onion v3, 52 for
+# I2P).
+_OCTET = r"(?:25[0-5]|2[0-4][0-9]|1?[0-9]?[0-9])"
+_TYPE_RE = re.compile(
+    r"(?P<cjdns>(?i:fc).*:.*)"
+    r"|(?P<ipv6>.*:.*)"
+    r"|(?P<onion_v2>.{16}\.onion)"
+    r"|(?P<onion_v3>.{56}\.onion)"
+    r"|(?P<i2p>.{52}\.b32\.i2p)"
+    rf"|(?P<ipv4>{_OCTET}(?:\.{_OCTET}){{3}})"
+)
+
+
+# most attributes are derived ones precomputed in __post_init__()
 @dataclass(frozen=True)
-class Address:
+class Address:  # pylint: disable=too-many-instance-attributes
     """Class to represent addresses of Bitcoin nodes."""
 
     host: str
     port: int = DEFAULT_MAINNET_PORT
-    timestamp: int = int(time.time())
-    supported_types: ClassVar[list[str]] = [
+    timestamp: int = field(default_factory=lambda: int(time.time()))
+    supported_types: ClassVar[tuple[str, ...]] = (
         "ipv4",
         "ipv6",
         "onion_v2",
         "onion_v3",
         "i2p",
         "cjdns",
-    ]
+    )
     # used by compress()
     _next_id: ClassVar[int] = 0
     _hash_to_id: ClassVar[dict] = {}
     _epoch: ClassVar[int] = int(time.time())
+    # derived from host (and port) in __post_init__()
+    _hash: int = field(init=False, repr=False, compare=False)
+    _str: str = field(init=False, repr=False, compare=False)
+    type: str = field(init=False, repr=False, compare=False)
+    is_ip: bool = field(init=False, repr=False, compare=False)
+    is_onion: bool = field(init=False, repr=False, compare=False)
+    is_i2p: bool = field(init=False, repr=False, compare=False)
+    is_cjdns: bool = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        """
+        Determine hash, string representation, network type and derived flags
+        once at construction.
+
+        These are used repeatedly (set operations, statistics, compression,
+        choice of timeouts and connection method, output), so computing them
+        eagerly avoids repeated hashing, formatting and property lookups. The
+        dataclass is frozen, so attributes are set using object.__setattr__().
+
+        IPv6 (and CJDNS) addresses are surrounded by square brackets in the
+        string representation.
+        """
+        object.__setattr__(self, "_hash", hash((self.host, self.port)))
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        object.__setattr__(self, "_str", f"{host}:{self.port}")
+        net_type = self._get_type()
+        object.__setattr__(self, "type", net_type)
+        object.__setattr__(self, "is_ip", net_type in ("ipv4", "ipv6"))
+        object.__setattr__(self, "is_onion", net_type in ("onion_v2", "onion_v3"))
+        object.__setattr__(self, "is_i2p", net_type == "i2p")
+        object.__setattr__(self, "is_cjdns", net_type == "cjdns")
 
     def __eq__(self, other):
         """Ignore timestamp for equality check"""
-        return self.host == other.host and self.port == other.port
+        return self is other or (self.host == other.host and self.port == other.port)
 
     def __hash__(self):
         """Ignore timestamp when creating hash"""
-        return hash((self.host, self.port))
+        return self._hash
 
     def __str__(self):
-        """Format address as string.
-
-        IPv6 (and CJDNS) addresses are surrounded by square brackets.
-        """
-        host = f"[{self.host}]" if ":" in self.host else self.host
-        return f"{host}:{self.port}"
+        """Return address formatted as string."""
+        return self._str
 
     @classmethod
     def from_str(cls, addr_str: str) -> "Address":
@@ -59,46 +98,13 @@ class Address:
             host, port = addr_str.split(":")
         return cls(host, int(port))
 
-    @cached_property
-    def type(self) -> str:  # pylint: disable=too-many-return-statements
-        """Determine network type only when required."""
-        if ":" in self.host and self.host.lower().startswith(CJDNS_PREFIX):
-            return "cjdns"
-        if ":" in self.host and not self.host.lower().startswith(CJDNS_PREFIX):
-            return "ipv6"
-        if self.host.endswith(".onion") and len(self.host) == TOR_V2_ADDR_LEN:
-            return "onion_v2"
-        if self.host.endswith(".onion") and len(self.host) == TOR_V3_ADDR_LEN:
-            return "onion_v3"
-        if self.host.endswith(".b32.i2p") and len(self.host) == I2P_ADDR_LEN:
-            return "i2p"
-        if len(octets := self.host.split(".")) == 4 and all(
-            0 <= int(o) < 256 for o in octets
-        ):
-            return "ipv4"
+    def _get_type(self) -> str:
+        """Determine network type."""
+        if match := _TYPE_RE.fullmatch(self.host):
+            return match.lastgroup
         log.error("unsupported address=%s", self)
         return "unknown"
 
-    @cached_property
-    def is_ip(self) -> bool:
-        """Determine if address is an IP address (IPv4 or IPv6 but not CJDNS)."""
-        return self.type in ("ipv4", "ipv6")
-
-    @cached_property
-    def is_onion(self) -> bool:
-        """Determine if address is an Onion address (v2 or v3)."""
-        return self.type in ("onion_v2", "onion_v3")
-
-    @cached_property
-    def is_i2p(self) -> bool:
-        """Determine if address is an I2P address."""
-        return self.type == "i2p"
-
-    @cached_property
-    def is_cjdns(self) -> bool:
-        """Determine if address is a CJDNS address."""
-        return self.type == "cjdns"
-
     def compress(self) -> Tuple[int, int, int]:
         """
         Compress Address class information for serialization.
@@ -124,6 +130,33 @@ class Address:
         delta = self._epoch - self.timestamp
         delta_zigzag = (delta << 1) ^ (delta >> 31)
 
-        net_id = self.supported_types.index(self.type)
+        net_id = NET_IDS[self.type]
 
         return addr_id, delta_zigzag, net_id
+
+    @classmethod
+    def compress_many(cls, addrs) -> list[Tuple[int, int, int]]:
+        """
+        Compress multiple addresses for serialization.
+
+        Equivalent to calling compress() on each address, but with lookups
+        hoisted out of the loop, which matters for addr replies containing
+        up to 1000 addresses.
+        """
+        hash_fn = mmh3.hash
+        hash_to_id = cls._hash_to_id
+        epoch = cls._epoch
+        result = []
+        for addr in addrs:
+            addr_hash = hash_fn(str(addr))
+            addr_id = hash_to_id.get(addr_hash)
+            if addr_id is None:
+                addr_id = hash_to_id[addr_hash] = Address._next_id
+                Address._next_id += 1
+            delta = epoch - addr.timestamp
+            result.append((addr_id, (delta << 1) ^ (delta >> 31), NET_IDS[addr.type]))
+        return result
+
+
+# network type to network id mapping used by Address.compress()
+NET_IDS = {net: net_id for net_id, net in enumerate(Address.supported_types)}
@@ -5,7 +5,7 @@ import importlib.metadata
 import os
 import socket
 import time
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, fields, is_dataclass
 from pathlib import Path
 
 __version__ = importlib.metadata.version(__package__ or __name__)
@@ -27,13 +27,26 @@ class VersionInfo:
         )
 
 
+def _as_dict(value):
+    """
+    Recursively convert dataclasses (and dicts thereof) to dicts.
+
+    Unlike `dataclasses.asdict()`, leaf values are not deep-copied.
+    """
+    if is_dataclass(value):
+        return {f.name: _as_dict(getattr(value, f.name)) for f in fields(value)}
+    if isinstance(value, dict):
+        return {k: _as_dict(v) for k, v in value.items()}
+    return value
+
+
 @dataclass
 class ComponentSettings:
     """Base class for components."""
 
     def to_dict(self):
         """Convert to dictionary."""
-        return asdict(self)
+        return _as_dict(self)
 
 
 @dataclass
@@ -105,6 +118,7 @@ class GCSSettings(ComponentSettings):
     bucket: str
     location: str
     credentials: str
+    bundle: bool
 
     @classmethod
     def parse(cls, args):
@@ -114,6 +128,7 @@ class GCSSettings(ComponentSettings):
             bucket=args.gcs_bucket,
             location=args.gcs_location,
             credentials=args.gcs_credentials,
+            bundle=args.gcs_bundle,
         )
 
 
@@ -131,12 +146,12 @@ class HistorySettings(ComponentSettings):
         return cls(
             enable=args.reachable_node_history,
             max_retries=args.reachable_node_history_max_retries,
-            path=Path(f"{args.result_path}/reachabe_nodes_history.json.bz2"),
+            path=Path(f"{args.result_path}/reachabe_nodes_history.json.zst"),
         )
 
 
 @dataclass
-class ResultSettings(ComponentSettings):
+class ResultSettings(ComponentSettings):  # pylint: disable=too-many-instance-attributes
     """Paths for output files."""
 
     path: Path
@@ -145,6 +160,8 @@ class ResultSettings(ComponentSettings):
     crawler_stats: Path
     history_settings: HistorySettings
     addr_data: Path
+    bundle: Path
+    chainparams_cache: Path
     gcs: GCSSettings
 
     @classmethod
@@ -158,6 +175,8 @@ class ResultSettings(ComponentSettings):
             crawler_stats=Path(f"{prefix}_crawler_stats.json"),
             history_settings=HistorySettings.parse(args),
             addr_data=Path(f"{prefix}_addr_data.dat"),
+            bundle=Path(f"{prefix}_results.tar"),
+            chainparams_cache=Path(f"{args.result_path}/chainparams.cpp"),
             gcs=GCSSettings.parse(args),
         )
 
@@ -246,7 +265,12 @@ class Settings:
         )
 
 
-def add_timeout_args(parser):
+def _env_bool(env: dict[str, str], key: str, default: bool) -> bool:
+    """Interpret environment variable `key` as boolean."""
+    return str(env.get(key, default)).lower() == "true"
+
+
+def add_timeout_args(parser, env: dict[str, str]):
     """Add command-line arguments related to network timeouts."""
 
     settings = {
@@ -265,46 +289,46 @@ def add_timeout_args(parser):
     for net, timeouts in settings.items():
         for op, timeout in timeouts.items():
             argument = f"--{net.lower()}-{op.lower()}-timeout"
-            default = os.environ.get(f"{net.upper()}_{op.upper()}_TIMEOUT", timeout)
+            default = env.get(f"{net.upper()}_{op.upper()}_TIMEOUT", timeout)
             help_ = f"{helps[op]} {net}"
             parser.add_argument(argument, type=float, default=default, help=help_)
 
 
-def add_general_args(parser):
+def add_general_args(parser, env: dict[str, str]):
     """Add command-line arguments related to crawler."""
 
     parser.add_argument(
         "--num-workers",
         type=int,
-        default=os.environ.get("NUM_WORKERS", 64),
+        default=env.get("NUM_WORKERS", 64),
         help="Number of crawler coroutines",
     )
 
     parser.add_argument(
         "--node-share",
         type=float,
-        default=os.environ.get("NODE_SHARE", 1.00),
+        default=env.get("NODE_SHARE", 1.00),
         help="Share of nodes to query for peers",
     )
 
     parser.add_argument(
         "--handshake-attempts",
         type=int,
-        default=os.environ.get("HANDSHAKE_ATTEMPTS", 3),
+        default=env.get("HANDSHAKE_ATTEMPTS", 3),
         help="Number of times to attempt node handshake if it does not succeed at first",
     )
 
     parser.add_argument(
         "--delay-start",
         type=int,
-        default=os.environ.get("DELAY_START", 10),
+        default=env.get("DELAY_START", 10),
         help="Delay before starting to wait for tor and i2p containers. Default: 10s",
     )
 
     parser.add_argument(
         "--getaddr-attempts",
         type=int,
-        default=os.environ.get("GETADDR_ATTEMPTS", 2),
+        default=env.get("GETADDR_ATTEMPTS", 2),
         help="Number of times to attempt getaddr requests for reachable nodes",
     )
 
@@ -339,14 +363,14 @@ def add_general_args(parser):
     parser.add_argument(
         "--log-level",
         type=str,
-        default=os.environ.get("LOG_LEVEL", "INFO"),
+        default=env.get("LOG_LEVEL", "INFO"),
         help="Logging verbosity",
     )
 
     parser.add_argument(
         "--result-path",
         type=Path,
-        default=os.environ.get("RESULT_PATH", "results"),
+        default=env.get("RESULT_PATH", "results"),
         help="Directory for results",
     )
 
@@ -374,7 +398,7 @@ def add_general_args(parser):
 
     parser.add_argument(
         "--timestamp",
-        default=os.environ.get(
+        default=env.get(
             "TIMESTAMP", time.strftime("%Y-%m-%dT%H-%M-%SZ", time.gmtime())
         ),
         help="Timestamp for results",
@@ -390,7 +414,7 @@ def add_general_args(parser):
     parser.add_argument(
         "--store-debug-log",
         action=argparse.BooleanOptionalAction,
-        default=str(os.environ.get("STORE_DEBUG_LOG", True)).lower() == "true",
+        default=_env_bool(env, "STORE_DEBUG_LOG", True),
         help="Store debug log",
     )
 
@@ -419,6 +443,12 @@ def add_general_args(parser):
         default=None,
         help="GCS credentials (service account private key file file, default: None)",
     )
+    parser.add_argument(
+        "--gcs-bundle",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Upload results to GCS as single tar archive (default: disabled)",
+    )
 
 
 def parse_args():
@@ -426,8 +456,9 @@ def parse_args():
 
     parser = argparse.ArgumentParser()
 
-    add_timeout_args(parser)
-    add_general_args(parser)
+    env = dict(os.environ)
+    add_timeout_args(parser, env)
+    add_general_args(parser, env)
     args = parser.parse_args()
 
     return args
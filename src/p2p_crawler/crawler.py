@@ -4,17 +4,28 @@ import asyncio
 import logging as log
 import random
 import time
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional
 
 import maillog
 
 from .address import Address
 from .config import CrawlerSettings
-from .decorators import print_runtime_stats, timing
+from .decorators import log_recent_runtimes, print_runtime_stats, timing
 from .dnsseeds import get_addresses_from_dns_seeds
 from .history import History
 from .node import Node
 
+# advertised addresses older than this (in seconds) are considered stale
+MAX_ADDR_AGE = 2 * 24 * 60 * 60
+
+# max. number of concurrent connection attempts for networks reached via local
+# proxies (Tor SOCKS proxy, I2P SAM bridge), which slow down when flooded
+# with simultaneous circuit/tunnel requests; other networks are not limited
+MAX_CONCURRENT_CONNECTS = {"onion_v2": 32, "onion_v3": 32, "i2p": 16}
+
+ADDR_DATA_BUFSIZE = 1024 * 1024  # 1 MiB
+
 
 @dataclass
 class AddressStats:
@@ -24,8 +35,8 @@ class AddressStats:
     timestamps: list[int]
 
     def to_dict(self):
-        """Convert to dictionary."""
-        return asdict(self)
+        """Convert to dictionary (without copying the lists)."""
+        return {"ages": self.ages, "timestamps": self.timestamps}
 
 
 @dataclass
@@ -39,7 +50,7 @@ class CrawlerStatistics:
 
 
 @dataclass
-class CrawlerNodeSets:
+class CrawlerNodeSets:  # pylint: disable=too-many-instance-attributes
     """Class for different sets of nodes mainted by the crawler.
 
     Contents:
@@ -48,21 +59,37 @@ class CrawlerNodeSets:
         to duplicate addresses from a DNS seed)
       - reachable: set of nodes confirmed reachable via established connection
       - unreachable: set of nodes confirmed unreachable
-      - pending: set of nodes currently pending processing (current seed distance)
+      - pending: list of nodes currently pending processing (current seed
+        distance); a list rather than a set so random nodes can be drawn in
+        O(1), duplicates are kept out via `known`
       - next: set of nodes pending processing once current seed distance is done
       - processing: set of nodes currently being processed (required to avoid
         re-adding a node that is currently getting processed and thus neither
         in any of the pending or labeled sets; also used in code for switching
         between pending and next node sets)
+      - historical: set of nodes reachable during previous runs; the ones not
+        encountered during this run are added to `pending` once there are no
+        more pending nodes for the current and next seed distance
+      - historical_unseen: set of historical nodes added to `pending` (kept
+        for the summary logged once the crawl is done)
+      - known: set of addresses of all nodes in any of the above sets
+        (maintained incrementally; used to filter out known advertised
+        addresses before creating nodes for them)
       - address_stats: dict with Address keys and AddressStats values
+      - node_done: event set whenever a node leaves `processing` (created in
+        `init()` because asyncio events must be created inside the event loop)
     """
 
     nodes_by_seed: dict[str, list[Node]] = field(default_factory=dict)
     reachable: set[Node] = field(default_factory=set)
     unreachable: set[Node] = field(default_factory=set)
-    pending: set[Node] = field(default_factory=set)
+    pending: list[Node] = field(default_factory=list)
     next: set[Node] = field(default_factory=set)
     processing: set[Node] = field(default_factory=set)
+    historical: set[Node] = field(default_factory=set)
+    historical_unseen: set[Node] = field(default_factory=set)
+    known: set[Address] = field(default_factory=set)
+    node_done: asyncio.Event = field(init=False, repr=False, compare=False)
 
     def init(self, addrs_by_seed: dict[str, list[Address]]):
         """
@@ -72,10 +99,14 @@ class CrawlerNodeSets:
         in `nodes_by_seed`. The set union of all addresses becomes the initial
         set of pending nodes (`pending`).
         """
+        self.node_done = asyncio.Event()
         for seed, addrs in addrs_by_seed.items():
             nodes = [Node(addr, seed_distance=0) for addr in addrs]
             self.nodes_by_seed[seed] = nodes
-            self.pending |= set(nodes)
+            for node in nodes:
+                if node.address not in self.known:
+                    self.known.add(node.address)
+                    self.pending.append(node)
         log.debug(
             "pending nodes initialized with %d nodes from DNS seeds.", len(self.pending)
         )
@@ -86,9 +117,14 @@ class CrawlerNodeSets:
 
         Return true if there are any currently pending nodes in `pending`.
 
+        If there are neither currently pending nodes nor nodes for the next
+        seed distance (`next`), add historical nodes not encountered yet to
+        `pending` (see `add_historical_unseen()`).
+
         If there are no more pending nodes but crawlers are still active
-        (`processing`), wait for 5s for as long as necessary until all crawlers
-        have finished adding to the `next` set. At some point, there will be no
+        (`processing`), wait until a crawler finishes processing a node (or
+        at most 5s) for as long as necessary until all crawlers have finished
+        adding to the `next` set. At some point, there will be no
         more pending nodes and no more active crawlers, leading to the `next`
         set becoming the `pending` set. Thus, check the `pending` set to exit
         the `processing` waiting loop.
@@ -100,25 +136,49 @@ class CrawlerNodeSets:
         if self.pending:
             return True
 
+        if self.historical and not self.next:
+            self.add_historical_unseen()
+            if self.pending:
+                return True
+
         while self.processing:
-            log.debug(
-                "No pending nodes but %d other crawler(s) still active: waiting 5s...",
-                len(self.processing),
-            )
-            log.debug("Processing: %s", self.processing)
-            await asyncio.sleep(5)
+            self.node_done.clear()
+            try:
+                await asyncio.wait_for(self.node_done.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                log.debug(
+                    "No pending nodes but %d other crawler(s) still active: waiting...",
+                    len(self.processing),
+                )
+                log.debug("Processing: %s", self.processing)
             if self.pending:
                 return True
 
         if self.next:
             log.info("Switching pending nodes to next seed distance.")
-            self.pending = self.next
+            self.pending = list(self.next)
             self.next = set()
             return True
 
         return False
 
-    @timing
+    def add_historical_unseen(self):
+        """
+        Add historical nodes not encountered during this run to `pending`.
+
+        Called once there is no other work left except for nodes that are still
+        being processed, so historical nodes are processed while the last
+        crawlers of the current seed distance finish.
+        """
+
+        historical = self.historical
+        self.historical = set()
+        unseen = [n for n in historical if n.address not in self.known]
+        log.info("Adding %d unseen historical node(s) to pending nodes", len(unseen))
+        self.historical_unseen.update(unseen)
+        self.known.update(n.address for n in unseen)
+        self.pending.extend(unseen)
+
     def get_node(self) -> Node:
         """
         Get a random node for processing.
@@ -127,24 +187,27 @@ class CrawlerNodeSets:
         (`pending`). Switching pending node sets is done in `nodes_left()`.
         """
 
-        node = random.choice(tuple(self.pending))
+        # swap random node with last one and pop it to avoid O(n) removal
+        pending = self.pending
+        i = random.randrange(len(pending))
+        node = pending[i]
+        pending[i] = pending[-1]
+        pending.pop()
         self.processing.add(node)
-        self.pending.remove(node)
         return node
 
-    @timing
     def set_reachable(self, node):
         """Mark node reachable and remove it from processing node set."""
         self.processing.remove(node)
         self.reachable.add(node)
+        self.node_done.set()
 
-    @timing
     def set_unreachable(self, node):
         """Mark node unreachable and remove it from processing node set."""
         self.processing.remove(node)
         self.unreachable.add(node)
+        self.node_done.set()
 
-    @timing
     def retry_or_give_up(self, node):
         """If node has retries left, decrement handshake retry counter and
         reinsert node into pending node set so it can be retried later. If
@@ -153,40 +216,42 @@ class CrawlerNodeSets:
         be established)."""
         if node.has_handshake_attempts_left():
             self.processing.remove(node)
-            self.pending.add(node)
+            self.pending.append(node)
+            self.node_done.set()
         else:
             self.set_reachable(node)
 
     @timing
-    def add_node_peers(self, node, adv_nodes):
+    def add_node_peers(self, node, addrs: set[Address]):
         """
-        Add nodes advertised (`adv_nodes`) by `node` to the set of nodes.
-
-        Determines previously unseen nodes (`new_nodes`) by removing known
-        nodes from advertised nodes (`adv_nodes`). Applies a threshold to all
-        previously unseen nodes to filter out stale (thus likely unreachable)
-        nodes. Inserts unseen fresh nodes into set of pending nodes for next
-        DNS seed distance (`next`).
+        Add nodes for addresses advertised (`addrs`) by `node` to the set of nodes.
+
+        Determines previously unseen addresses (`new_addrs`) by removing known
+        addresses from advertised addresses (`addrs`). Applies a threshold
+        to all previously unseen addresses to filter out stale (thus likely
+        unreachable) nodes. Creates nodes only for unseen fresh addresses and
+        inserts them into set of pending nodes for next DNS seed distance
+        (`next`).
         """
 
-        threshold = int(time.time()) - (2 * 24 * 60 * 60)
-        known_nodes = (
-            self.reachable
-            | self.unreachable
-            | self.pending
-            | self.next
-            | self.processing
+        if not addrs:
+            return
+
+        threshold = int(time.time()) - MAX_ADDR_AGE
+        new_addrs = addrs - self.known
+        fresh_new_addrs = [a for a in new_addrs if a.timestamp > threshold]
+        self.known.update(fresh_new_addrs)
+        seed_distance = node.seed_distance + 1
+        self.next.update(
+            Node(address=addr, seed_distance=seed_distance) for addr in fresh_new_addrs
         )
-        new_nodes = adv_nodes - known_nodes
-        fresh_new_nodes = {n for n in new_nodes if n.address.timestamp > threshold}
-        self.next.update(fresh_new_nodes)
         log.info(
             "Added %d node(s) advertised by %s (total=%d, known=%d, new_stale=%d)",
-            len(fresh_new_nodes),
+            len(fresh_new_addrs),
             node,
-            len(adv_nodes),
-            len(adv_nodes) - len(new_nodes),
-            len(new_nodes) - len(fresh_new_nodes),
+            len(addrs),
+            len(addrs) - len(new_addrs),
+            len(new_addrs) - len(fresh_new_addrs),
         )
 
 
@@ -197,6 +262,15 @@ class Crawler:
     settings: CrawlerSettings
     nodes: CrawlerNodeSets = field(default_factory=CrawlerNodeSets)
     stats: CrawlerStatistics = field(default_factory=CrawlerStatistics)
+    # created in run() because asyncio primitives must be created inside the
+    # event loop
+    connect_limits: dict[str, asyncio.Semaphore] = field(
+        init=False, repr=False, compare=False
+    )
+    # kept open while crawling if addr data is recorded
+    addr_data_file: Optional[BinaryIO] = field(
+        init=False, default=None, repr=False, compare=False
+    )
 
     async def run(self):
         """
@@ -206,50 +280,69 @@ class Crawler:
         wait for Tor and/or I2P Docker containers to be ready).
 
         Initially, the crawler will request addresses from the DNS seeds to
-        bootstrap its node sets. Next, `num_workers` crawler instances are
-        launched along with a monitoring thread.
+        bootstrap its node sets. DNS seeds are queried while waiting for
+        `delay_start`, since they do not depend on Tor or I2P. Next,
+        `num_workers` crawler instances are launched along with a monitoring
+        thread.
 
         If the `--reachable-node-history` command-line option is set, nodes
         discovered during previous runs but not during this run will be tried
-        next.
+        once no other nodes are pending. The history is read while waiting for
+        `delay_start` as well.
         """
 
+        dns_seeds = asyncio.create_task(
+            get_addresses_from_dns_seeds(
+                self.settings.result_settings.chainparams_cache
+            )
+        )
+        # configured first so historical nodes can be parsed in the thread
+        # loading the history
+        Node.configure(self.settings.node_settings)
+        history = None
+        if self.settings.result_settings.history_settings.enable:
+            # history file I/O and parsing are blocking, so run them in a
+            # separate thread
+            history = asyncio.create_task(asyncio.to_thread(self.load_history))
         if delay := self.settings.delay_start:
             log.info("Delaying start for %d seconds...", delay)
-            time.sleep(delay)
+            await asyncio.sleep(delay)
 
-        Node.configure(self.settings.node_settings)
-        addrs_by_seed = get_addresses_from_dns_seeds()
+        self.connect_limits = {
+            net: asyncio.Semaphore(limit)
+            for net, limit in MAX_CONCURRENT_CONNECTS.items()
+        }
+        addrs_by_seed = await dns_seeds
         self.nodes.init(addrs_by_seed)
+        historical = set()
+        if history is not None:
+            history = await history
+            historical = history.get_reachable_nodes()
+            self.nodes.historical = historical
 
-        tasks = [self.crawler() for _ in range(self.settings.num_workers)]
-        tasks.append(self.monitor())
-        await asyncio.gather(*tasks)
-
-        if self.settings.result_settings.history_settings.enable:
-            history = History(
-                settings=self.settings.result_settings.history_settings,
-                version=self.settings.version_info.version,
-                timestamp=self.settings.result_settings.timestamp,
-            )
-            historical_nodes = history.get_reachable_nodes()
-            historical_reached = historical_nodes & self.nodes.reachable
-            historical_not_reached = historical_nodes & self.nodes.unreachable
-            historical_unseen = (
-                historical_nodes - historical_reached - historical_not_reached
-            )
+        if self.settings.record_addr_data:
+            self._open_addr_data()
+        try:
+            await self.run_workers()
+        finally:
+            if self.addr_data_file is not None:
+                self.addr_data_file.close()
+                self.addr_data_file = None
+
+        if history is not None:
+            # reached and not_reached refer to historical nodes encountered
+            # during the regular crawl
+            unseen = self.nodes.historical_unseen
             log.info(
                 "Read %d historical nodes (reached=%d, not_reached=%d, unseen=%d)",
-                len(historical_nodes),
-                len(historical_reached),
-                len(historical_not_reached),
-                len(historical_unseen),
+                len(historical),
+                len((historical - unseen) & self.nodes.reachable),
+                len((historical - unseen) & self.nodes.unreachable),
+                len(unseen),
+            )
+            await asyncio.to_thread(
+                history.update_and_persist, reachable_nodes_now=self.nodes.reachable
             )
-            self.nodes.pending |= historical_unseen
-            tasks = [self.crawler() for _ in range(self.settings.num_workers)]
-            tasks.append(self.monitor())
-            await asyncio.gather(*tasks)
-            history.update_and_persist(reachable_nodes_now=self.nodes.reachable)
 
         print_runtime_stats()
         log.info(
@@ -260,6 +353,41 @@ class Crawler:
             len(self.nodes.unreachable),
         )
 
+    def load_history(self) -> History:
+        """Load reachable node history and parse historical nodes (blocking)."""
+        history = History(
+            settings=self.settings.result_settings.history_settings,
+            version=self.settings.version_info.version,
+            timestamp=self.settings.result_settings.timestamp,
+        )
+        # parsed nodes are cached, so get_reachable_nodes() is cheap afterwards
+        history.get_reachable_nodes()
+        return history
+
+    async def run_workers(self):
+        """
+        Run `num_workers` crawler instances along with the monitor.
+
+        Return once all of them have finished. If one of them raises an
+        exception, cancel the others and re-raise it, so no crawlers are left
+        running in the background (`asyncio.TaskGroup` would do this but
+        requires Python 3.11).
+        """
+
+        tasks = [
+            asyncio.create_task(self.crawler())
+            for _ in range(self.settings.num_workers)
+        ]
+        tasks.append(asyncio.create_task(self.monitor()))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            task.result()
+
     async def crawler(self):
         """
         Crawling loop executed by each worker.
@@ -278,7 +406,11 @@ class Crawler:
                 return
 
             node = self.nodes.get_node()
-            success = await node.connect()
+            if (limit := self.connect_limits.get(node.address.type)) is not None:
+                async with limit:
+                    success = await node.connect()
+            else:
+                success = await node.connect()
             self.stats.num_processed_nodes += 1
             if not success:
                 await node.disconnect()
@@ -297,14 +429,37 @@ class Crawler:
             await node.disconnect()
             self.nodes.set_reachable(node)
 
+    def _open_addr_data(self):
+        """
+        Open addr data file for the duration of the crawl.
+
+        The file is opened once with a large write buffer, so individual
+        records do not cause write syscalls. If the file is empty, the header
+        is written (see `_write_addr_data()`).
+        """
+
+        f = open(  # pylint: disable=consider-using-with
+            self.settings.result_settings.addr_data, "ab", buffering=ADDR_DATA_BUFSIZE
+        )
+        if f.tell() == 0:
+            magic = "p2p-addr-data".encode("ascii")
+            version = 1
+            epoch = Address._epoch
+            f.write(magic)
+            f.write(version.to_bytes(1, "big"))
+            f.write(epoch.to_bytes(4, "big"))
+            f.write("\n".encode("ascii"))
+        self.addr_data_file = f
+
     @timing
-    def _write_addr_data(self, node: Node, addrs: list[Address]):
+    def _write_addr_data(self, node: Node, addrs: set[Address]):
         """
         Record hashes of addresses provided by each node.
 
         Data is written using a custom format to preserve space.
         The header is a magic string followed by a version byte, a 4-byte epoch
         timestamp (used to reconstruct address seen_by timestamps) and a newline.
+        It is written when the file is opened (see `_open_addr_data()`).
 
         Node records consist of the length of the node string as varint followed by the node string.
         The addr data for each node record consists of the number of address
@@ -318,49 +473,38 @@ class Crawler:
         file.
         """
 
-        def to_varint(value: int) -> bytes:
-            """Encode an integer as varint."""
-            buf = bytearray()
+        def append_varint(buf: bytearray, value: int):
+            """Append an integer encoded as varint to `buf`."""
             while value > 0x7F:
                 buf.append((value & 0x7F) | 0x80)
                 value >>= 7
             buf.append(value)
-            return buf
-
-        with open(self.settings.result_settings.addr_data, "ab") as f:
-            data = b""
-            # header
-            if f.tell() == 0:
-                magic = "p2p-addr-data".encode("ascii")
-                version = 1
-                epoch = Address._epoch
-                data += magic
-                data += version.to_bytes(1, "big")
-                data += epoch.to_bytes(4, "big")
-                data += "\n".encode("ascii")
-
-            # node that sent the addr reply
-            data += to_varint(len(str(node.address)))
-            data += str(node.address).encode("ascii")
-
-            # number of records, followed by records
-            data += to_varint(len(addrs))
-            for addr in addrs:
-                addr_id, addr_timestamp_delta_zigzag, net_id = addr.compress()
-                addr_net_id = (addr_id << 3) | net_id
-                data += to_varint(addr_net_id)
-                data += to_varint(addr_timestamp_delta_zigzag)
-            data += "\n".encode("ascii")
-            f.write(data)
+
+        data = bytearray()
+
+        # node that sent the addr reply
+        node_str = str(node.address).encode("ascii")
+        append_varint(data, len(node_str))
+        data += node_str
+
+        # number of records, followed by records
+        append_varint(data, len(addrs))
+        for addr_id, addr_timestamp_delta_zigzag, net_id in Address.compress_many(
+            addrs
+        ):
+            append_varint(data, (addr_id << 3) | net_id)
+            append_varint(data, addr_timestamp_delta_zigzag)
+        data += "\n".encode("ascii")
+        self.addr_data_file.write(data)
 
     @timing
     async def _get_and_process_peers(self, node):
         """
         Obtain and process a node's peers.
 
-        Sends 'getaddr' to peer and wait for `addr` replies. Converts addresses
-        from 'addr' messages to `Node`s and adds suitable ones to set of
-        pending nodes (via `node.add_node_peers()`).
+        Sends 'getaddr' to peer and wait for `addr` replies. Adds nodes for
+        suitable addresses from 'addr' messages to set of pending nodes (via
+        `nodes.add_node_peers()`).
 
         Optional:
         - If `--record-addr-data` is set, write addr data provided by each node
@@ -374,14 +518,7 @@ class Crawler:
         if self.settings.record_addr_data:
             self._write_addr_data(node, addrs)
 
-        peers = {
-            Node(
-                address=addr,
-                seed_distance=node.seed_distance + 1,
-            )
-            for addr in addrs
-        }
-        self.nodes.add_node_peers(node, peers)
+        self.nodes.add_node_peers(node, addrs)
 
     async def monitor(self):
         """Output status information every five seconds. Return when no more crawlers are active"""
@@ -394,8 +531,14 @@ class Crawler:
                 len(self.nodes.pending) + len(self.nodes.next),
                 len(self.nodes.processing),
             )
-
-            if not (self.nodes.pending or self.nodes.processing or self.nodes.next):
+            log_recent_runtimes()
+
+            if not (
+                self.nodes.pending
+                or self.nodes.processing
+                or self.nodes.next
+                or self.nodes.historical
+            ):
                 log.info("[STATUS] No more nodes and no more active crawlers: exiting")
                 self.stats.runtime = int(time.time() - self.stats.time_started)
                 if self.stats.runtime > (12 * 3600):
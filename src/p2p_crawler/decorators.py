@@ -1,34 +1,90 @@
 """This module contains custom function decorators."""
 
+import asyncio
 import functools
 import logging as log
+import os
 import time
+from collections import defaultdict, deque
 
+# function timing adds overhead to every call, so it is only enabled when
+# profiling; checked once at decoration (i.e., import) time
+TIMING_ENABLED = str(os.environ.get("CRAWLER_PROFILE", False)).lower() == "true"
+
+# cumulative runtime in nanoseconds
 cumulative_runtime = {}
 
+# most recent runtimes in nanoseconds, drained by log_recent_runtimes()
+RECENT_RUNTIMES_MAXLEN = 1024
+recent_runtimes = defaultdict(lambda: deque(maxlen=RECENT_RUNTIMES_MAXLEN))
+
 
 def timing(func):
-    """Decorator to time function calls and track cumulative function runtime."""
+    """
+    Decorator to time function calls and track cumulative function runtime.
+
+    Returns `func` unchanged unless timing is enabled via `CRAWLER_PROFILE`.
+    Coroutine functions are timed until the coroutine completes rather than
+    until it is created.
+    """
+
+    if not TIMING_ENABLED:
+        return func
+
+    name = func.__name__
+    recent = recent_runtimes[name]
+
+    if asyncio.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def wrap_async(*args, **kw):
+            time_start = time.perf_counter_ns()
+            result = await func(*args, **kw)
+            runtime = time.perf_counter_ns() - time_start
+            recent.append(runtime)
+            cumulative_runtime[name] = cumulative_runtime.get(name, 0) + runtime
+            return result
+
+        return wrap_async
 
     @functools.wraps(func)
     def wrap(*args, **kw):
-        time_start = time.time()
+        time_start = time.perf_counter_ns()
         result = func(*args, **kw)
-        runtime = (time.time() - time_start) * 1000
-        f = func.__name__
-        log.debug("execution time of function %s: %.1f ms.", f, runtime)
-        cumulative_runtime[f] = cumulative_runtime.get(f, 0) + runtime
+        runtime = time.perf_counter_ns() - time_start
+        recent.append(runtime)
+        cumulative_runtime[name] = cumulative_runtime.get(name, 0) + runtime
         return result
 
     return wrap
 
 
+def log_recent_runtimes():
+    """
+    Log summary of runtimes recorded via @timing decorator since last call.
+
+    Replaces logging each call individually, which is expensive for functions
+    called thousands of times per second.
+    """
+    enabled = log.getLogger().isEnabledFor(log.DEBUG)
+    for func_name, runtimes in recent_runtimes.items():
+        if runtimes and enabled:
+            log.debug(
+                "execution time of function %s: samples=%d, mean=%.1f ms, max=%.1f ms",
+                func_name,
+                len(runtimes),
+                sum(runtimes) / len(runtimes) / 1e6,
+                max(runtimes) / 1e6,
+            )
+        runtimes.clear()
+
+
 def print_runtime_stats():
     """Output runtime statistics collected via @timing decorator."""
-    for func_name, runtime_ms in cumulative_runtime.items():
+    for func_name, runtime_ns in cumulative_runtime.items():
         log.info(
             "Cumulative runtime of %s: %.1fs (%dms)",
             func_name,
-            runtime_ms / 1000,
-            runtime_ms,
+            runtime_ns / 1e9,
+            runtime_ns // 1_000_000,
         )
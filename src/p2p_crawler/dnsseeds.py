@@ -1,8 +1,12 @@
 """This module contains functionality related to Bitcoin's DNS seeds."""
 
+import asyncio
 import logging as log
 import re
 import socket
+import time
+from pathlib import Path
+from typing import Optional
 
 import maillog
 import requests
@@ -21,30 +25,58 @@ DNS_SEEDS = [
     "dnsseed.emzy.de.",
     "seed.bitcoin.wiz.biz.",
     "seed.mainnet.achownodes.xyz.",
-    "seed.btc.petertodd.net.",
 ]
 
+CHAINPARAMS_URL = (
+    "https://raw.githubusercontent.com/bitcoin/bitcoin/master"
+    "/src/kernel/chainparams.cpp"
+)
+CHAINPARAMS_MAX_AGE = 24 * 60 * 60  # use cached copy without revalidation for a day
+
+# Matches comments as well as seeds so that seeds in comments are skipped in a
+# single pass: only matches outside of comments capture a seed
+SEED_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|vSeeds\.emplace_back\(\s*"([^"]+)"\s*\);', re.DOTALL
+)
+
 
 @timing
-def get_addresses_from_dns_seeds() -> dict[str, list[Address]]:
+async def get_addresses_from_dns_seeds(
+    chainparams_cache: Path,
+) -> dict[str, list[Address]]:
     """
     Queries DNS seeds for node addresses.
 
+    All DNS seeds are queried concurrently. Meanwhile, the list of DNS seeds
+    is compared to the one in Bitcoin Core in a separate thread (using
+    `chainparams_cache` to cache Bitcoin Core's chainparams.cpp).
+
     Returns:
         Dictionary with DNS seeds as keys and obtained addresses as values.
     """
 
     # Check if the DNS seeds hardcoded in the crawler match those in Bitcoin Core
-    compare_seeds_to_bitcoin_master()
+    compare_seeds = asyncio.create_task(
+        asyncio.to_thread(compare_seeds_to_bitcoin_master, chainparams_cache)
+    )
+
+    loop = asyncio.get_running_loop()
+    replies = await asyncio.gather(
+        *(loop.getaddrinfo(host, 53, proto=socket.IPPROTO_TCP) for host in DNS_SEEDS),
+        return_exceptions=True,
+    )
+    await compare_seeds
 
     addrs_by_seed = {}
-    for host in DNS_SEEDS:
-        try:
-            reply = socket.getaddrinfo(host, 53, proto=socket.IPPROTO_TCP)
-        except OSError as e:
-            log.warning("error getting seeds from %s: %s (%s)", host, e, repr(e))
+    for host, reply in zip(DNS_SEEDS, replies):
+        if isinstance(reply, OSError):
+            log.warning(
+                "error getting seeds from %s: %s (%s)", host, reply, repr(reply)
+            )
             addrs_by_seed[host] = []
             continue
+        if isinstance(reply, BaseException):
+            raise reply
 
         # getaddrinfo() returns 5-tuple (family, type, proto, canonname, sockaddr);
         # IP address can be found in sockaddr, which is 2-tuple (address, port)
@@ -60,17 +92,77 @@ def get_addresses_from_dns_seeds() -> dict[str, list[Address]]:
     return addrs_by_seed
 
 
-def compare_seeds_to_bitcoin_master() -> None:
-    """Compares the list of DNS seeds hardcoded into the crawler to the list in Bitcoin Core."""
+def read_chainparams_cache(cache_path: Path) -> Optional[str]:
+    """Return cached chainparams.cpp, or None if the cache cannot be read."""
+    try:
+        return cache_path.read_text()
+    except OSError as e:
+        maillog.warning(f"Error reading cached DNS seeds from Bitcoin Core: {e}")
+        return None
+
+
+def fetch_chainparams(cache_path: Path) -> Optional[str]:
+    """
+    Return contents of Bitcoin Core's chainparams.cpp.
+
+    The file is cached at `cache_path`, its ETag next to it (`.etag` suffix).
+    A cached copy younger than `CHAINPARAMS_MAX_AGE` is used as is; an older
+    one is revalidated using a conditional request. If the request fails, the
+    cached copy (if any) is used regardless of its age. Errors accessing the
+    cache do not abort the crawl: the fetched content is used if available;
+    otherwise, None is returned.
+    """
+
+    etag_path = cache_path.with_name(cache_path.name + ".etag")
+    try:
+        age = time.time() - cache_path.stat().st_mtime
+    except OSError:
+        age = None
+    if age is not None and age < CHAINPARAMS_MAX_AGE:
+        log.info("Using cached DNS seeds from Bitcoin Core master (%s)", cache_path)
+        if (cpp_content := read_chainparams_cache(cache_path)) is not None:
+            return cpp_content
+        age = None
+
+    headers = {}
+    if age is not None:
+        try:
+            headers["If-None-Match"] = etag_path.read_text()
+        except OSError:
+            pass
 
-    # Download chainparams.cpp which contains the DNS seeds hardcoded in Bitcoin Core
     log.info("Fetching DNS seeds from Bitcoin Core master...")
-    url = "https://raw.githubusercontent.com/bitcoin/bitcoin/master/src/kernel/chainparams.cpp"
     try:
-        response = requests.get(url, timeout=10)
-        cpp_content = response.text
+        response = requests.get(CHAINPARAMS_URL, headers=headers, timeout=10)
     except requests.RequestException as e:
         maillog.warning(f"Error fetching DNS seeds from Bitcoin Core: {e}")
+        return read_chainparams_cache(cache_path) if age is not None else None
+
+    if response.status_code == 304:
+        log.info("Cached DNS seeds from Bitcoin Core master still up to date")
+        try:
+            cache_path.touch()
+        except OSError as e:
+            log.warning("Could not update DNS seed cache timestamp: %s", e)
+        return read_chainparams_cache(cache_path)
+
+    cpp_content = response.text
+    if response.status_code == 200:
+        try:
+            cache_path.write_text(cpp_content)
+            if etag := response.headers.get("ETag"):
+                etag_path.write_text(etag)
+        except OSError as e:
+            log.warning("Could not cache DNS seeds from Bitcoin Core: %s", e)
+    return cpp_content
+
+
+def compare_seeds_to_bitcoin_master(chainparams_cache: Path) -> None:
+    """Compares the list of DNS seeds hardcoded into the crawler to the list in Bitcoin Core."""
+
+    # Get chainparams.cpp which contains the DNS seeds hardcoded in Bitcoin Core
+    cpp_content = fetch_chainparams(chainparams_cache)
+    if cpp_content is None:
         return
 
     # Extract the class CMainParams from chainparams to get mainnet seeds
@@ -95,16 +187,13 @@ def compare_seeds_to_bitcoin_master() -> None:
         return
     class_content = cpp_content[brace_start + 1 : pos - 1]
 
-    # Remove commentsm, then extract seeds
-    class_content_no_comments = re.sub(
-        r"//.*?$|/\*.*?\*/", "", class_content, flags=re.MULTILINE | re.DOTALL
-    )
-    pattern = r'vSeeds\.emplace_back\(\s*"([^"]+)"\s*\);'
-    matches = re.findall(pattern, class_content_no_comments)
-    seeds_master = set(matches)
+    # Extract seeds, skipping comments
+    # Compare without trailing dots (fully qualified vs. relative names)
+    seeds_master = {seed.rstrip(".") for seed in SEED_RE.findall(class_content) if seed}
+    seeds_crawler = {seed.rstrip(".") for seed in DNS_SEEDS}
 
-    missing = seeds_master - set(DNS_SEEDS)
-    extra = set(DNS_SEEDS) - seeds_master
+    missing = seeds_master - seeds_crawler
+    extra = seeds_crawler - seeds_master
 
     if missing:
         maillog.warning(
@@ -1,10 +1,15 @@
 """Module for dealing with node data from previous runs."""
 
 import bz2
-import json
 import logging as log
-from collections import defaultdict
+import os
+from collections import Counter
 from dataclasses import dataclass
+from functools import cached_property
+from itertools import chain
+
+import orjson
+import zstandard as zstd
 
 from .address import Address
 from .config import HistorySettings
@@ -16,10 +21,14 @@ class History:
     """
     Class for handling reachable node data from previous runs.
 
-    Uses bz2-compressed JSON format, with `_metadata` as key for a metadata
+    Uses zstd-compressed JSON format, with `_metadata` as key for a metadata
     dict (featuring `last_run`, `version`, and `stats`) as well as
     `reachable_nodes` as key for a node dict (with node addresses as keys to
     dicts containing `network_type` and `retries_left`).
+
+    History files written by earlier versions (bz2-compressed, same path with
+    `.bz2` instead of `.zst` suffix) are read if no zstd-compressed history
+    file exists yet.
     """
 
     settings: HistorySettings
@@ -28,20 +37,32 @@ class History:
 
     def __post_init__(self):
         """Read data from the reachable nodes history JSON file."""
+        legacy_path = self.settings.path.with_suffix(".bz2")
         try:
-            with bz2.open(self.settings.path, "rt") as file:
-                self.data = json.load(file)
-                log.debug(
-                    "Read reachable nodes history (last_run=%s, version=%s)",
-                    self.data["_metadata"]["last_run"],
-                    self.data["_metadata"]["version"],
-                )
+            with open(self.settings.path, "rb") as file:
+                with zstd.ZstdDecompressor().stream_reader(file) as reader:
+                    self.data = orjson.loads(reader.read())
         except FileNotFoundError:
-            log.warning("History file %s not found.", self.settings.path)
-            self.data = {"_metadata": {"stats": []}, "reachable_nodes": {}}
+            try:
+                self.data = orjson.loads(bz2.decompress(legacy_path.read_bytes()))
+            except FileNotFoundError:
+                log.warning("History file %s not found.", self.settings.path)
+                self.data = {"_metadata": {"stats": []}, "reachable_nodes": {}}
+                return
+            log.info("Read legacy history file %s", legacy_path)
+        log.debug(
+            "Read reachable nodes history (last_run=%s, version=%s)",
+            self.data["_metadata"]["last_run"],
+            self.data["_metadata"]["version"],
+        )
 
     def get_reachable_nodes(self) -> set[Node]:
-        """Return list of reachable nodes from previous runs."""
+        """Return set of reachable nodes from previous runs."""
+        return self._reachable_nodes_history
+
+    @cached_property
+    def _reachable_nodes_history(self) -> set[Node]:
+        """Parse reachable nodes from previous runs once."""
 
         if not self.data["reachable_nodes"]:
             return set()
@@ -68,61 +89,89 @@ class History:
         3. Persist history to file
         """
 
-        reachable_nodes_history = self.get_reachable_nodes()
-
-        # add reachable nodes not seen previously to history
-        new_nodes = reachable_nodes_now - reachable_nodes_history
-        for new_node in new_nodes:
-            address = str(new_node.address)
-            self.data["reachable_nodes"][address] = {
-                "network_type": new_node.address.type,
-                "retries_left": self.settings.max_retries,
-            }
-
-        # decrement retries for previously seen historical nodes that were unreachable during this run
-        unreachable_nodes = reachable_nodes_history - reachable_nodes_now
-        num_removed = 0
-        for unreachable_node in unreachable_nodes:
-            address = str(unreachable_node.address)
-            self.data["reachable_nodes"][address]["retries_left"] -= 1
-            if self.data["reachable_nodes"][address]["retries_left"] == 0:
-                del self.data["reachable_nodes"][address]
-                num_removed += 1
-
-        # reset retries for previously seen historical nodes that were reachable during this run
-        nodes_to_reset = reachable_nodes_history - unreachable_nodes
-        for node_to_reset in nodes_to_reset:
-            address = str(node_to_reset.address)
-            self.data["reachable_nodes"][address][
-                "retries_left"
-            ] = self.settings.max_retries
+        # work on address strings (the keys of the history dict) rather than
+        # Node objects, so historical entries do not need to be parsed
+        history = self.data["reachable_nodes"]
+        max_retries = self.settings.max_retries
+        nodes_now = {str(node.address): node for node in reachable_nodes_now}
+        num_history = len(history)
+        # historical addresses in their existing order, then new addresses in
+        # sorted order: iterating over a set would make the order of new
+        # entries (and thus the persisted file) depend on the hash seed
+        addrs_new = sorted(nodes_now.keys() - history.keys())
+
+        # single pass over current and historical nodes:
+        #  - add reachable nodes not seen previously to history
+        #  - reset retries for historical nodes that were reachable during this run
+        #  - decrement retries for historical nodes that were unreachable during
+        #    this run, removing them when no retries are left
+        # network types of the resulting history are counted along the way
+        new_net_types = Counter()
+        num_net_type = Counter()
+        num_changes = Counter()
+        for address in chain(list(history), addrs_new):
+            entry = history.get(address)
+            if entry is None:
+                net_type = nodes_now[address].address.type
+                history[address] = {
+                    "network_type": net_type,
+                    "retries_left": max_retries,
+                }
+                new_net_types[net_type] += 1
+                num_net_type[net_type] += 1
+            elif address in nodes_now:
+                entry["retries_left"] = max_retries
+                num_changes["retries_reset"] += 1
+                num_net_type[entry["network_type"]] += 1
+            else:
+                entry["retries_left"] -= 1
+                num_changes["retries_decr"] += 1
+                if entry["retries_left"] == 0:
+                    del history[address]
+                    num_changes["removed"] += 1
+                else:
+                    num_net_type[entry["network_type"]] += 1
 
         # update metadata
         self.data["_metadata"]["last_run"] = self.timestamp
         self.data["_metadata"]["version"] = self.version
-        num_net_type = defaultdict(int)
-        for addr_stats in self.data["reachable_nodes"].values():
-            net_type = addr_stats["network_type"]
-            num_net_type[net_type] += 1
         num_net_type_ordered = dict(sorted(num_net_type.items()))
         self.data["_metadata"]["stats"].append({self.timestamp: num_net_type_ordered})
 
-        # persist and output stats
-        with bz2.open(self.settings.path, "wt") as file:
-            json.dump(self.data, file, indent=4, sort_keys=True)
+        self._persist(new_net_types, num_changes, num_history)
+
+    def _persist(self, new_net_types: Counter, num_changes: Counter, num_history: int):
+        """
+        Persist history to file and output stats.
+
+        `new_net_types` holds the network types of added nodes, `num_changes`
+        the number of reset, decremented and removed historical entries, and
+        `num_history` the size of the history before the update.
+        """
+
+        # write to temporary file first, then rename, so a crash while
+        # writing cannot corrupt the existing history
+        # compact and unsorted: the file is only read back by the crawler, and
+        # entries are inserted in a fixed order (see update_and_persist()), so
+        # the output is deterministic
+        data = orjson.dumps(self.data)
+        path_tmp = self.settings.path.with_name(f"{self.settings.path.name}.tmp")
+        with open(path_tmp, "wb") as file:
+            file.write(zstd.ZstdCompressor().compress(data))
+        os.replace(path_tmp, self.settings.path)
         log.info(
             "Updated reachable nodes history (added=%d "
             "[ipv4=%d, ipv6=%d, onion=%d, i2p=%d, cjdns=%d], "
             "retries_reset=%d, retries_decr=%d, removed=%d, old_hist_size=%d, new_hist_size=%d)",
-            len(new_nodes),
-            len([n for n in new_nodes if n.address.type == "ipv4"]),
-            len([n for n in new_nodes if n.address.type == "ipv6"]),
-            len([n for n in new_nodes if n.address.type in ["onion_v2", "onion_v3"]]),
-            len([n for n in new_nodes if n.address.type == "i2p"]),
-            len([n for n in new_nodes if n.address.type == "cjdns"]),
-            len(nodes_to_reset),
-            len(unreachable_nodes),
-            num_removed,
-            len(reachable_nodes_history),
+            sum(new_net_types.values()),
+            new_net_types["ipv4"],
+            new_net_types["ipv6"],
+            new_net_types["onion_v2"] + new_net_types["onion_v3"],
+            new_net_types["i2p"],
+            new_net_types["cjdns"],
+            num_changes["retries_reset"],
+            num_changes["retries_decr"],
+            num_changes["removed"],
+            num_history,
             len(self.data["reachable_nodes"]),
         )
@@ -4,7 +4,7 @@ import asyncio
 import logging as log
 import time
 from dataclasses import dataclass, field
-from typing import ClassVar
+from typing import ClassVar, Optional
 
 import i2plib
 from python_socks.async_.asyncio import Proxy
@@ -13,6 +13,9 @@ from .address import Address
 from .config import NetworkSettings
 from .protocol import NetworkEnvelope, PingMessage, PongMessage
 
+# command-to-class mappings used by Socket.receive(), by tuple of message classes
+_COMMAND_TO_CLASS: dict[tuple, dict] = {}
+
 
 @dataclass
 class Socket:
@@ -24,6 +27,17 @@ class Socket:
     _reader: asyncio.StreamReader = field(init=False)
     _writer: asyncio.StreamWriter = field(init=False)
     i2p_session_id: ClassVar = None
+    # created on first use, so it is bound to the running event loop
+    _i2p_session_lock: ClassVar[Optional[asyncio.Lock]] = None
+    # network type to connect method name mapping used by connect()
+    CONNECT_METHODS: ClassVar[dict[str, str]] = {
+        "ipv4": "_connect_ip",
+        "ipv6": "_connect_ip",
+        "onion_v2": "_connect_onion",
+        "onion_v3": "_connect_onion",
+        "i2p": "_connect_i2p",
+        "cjdns": "_connect_ip",
+    }
 
     def send(self, message):
         """Send message via socket."""
@@ -33,8 +47,11 @@ class Socket:
     async def receive(self, *message_classes, timeout: int):
         """Receive message via socket."""
         command = None
-        command_to_class = {m.command: m for m in message_classes}
-        while command not in command_to_class.keys():
+        command_to_class = _COMMAND_TO_CLASS.get(message_classes)
+        if command_to_class is None:
+            command_to_class = {m.command: m for m in message_classes}
+            _COMMAND_TO_CLASS[message_classes] = command_to_class
+        while command not in command_to_class:
             fut = NetworkEnvelope.parse(self._reader)
             envelope = await asyncio.wait_for(fut, timeout=timeout)
             command = envelope.command
@@ -62,16 +79,10 @@ class Socket:
 
         time_start = time.time()
 
-        if addr.is_ip:
-            await self._connect_ip(addr, timeout)
-        elif addr.is_onion:
-            await self._connect_onion(addr, timeout)
-        elif addr.is_i2p:
-            await self._connect_i2p(addr, timeout)
-        elif addr.is_cjdns:
-            await self._connect_ip(addr, timeout)
-        else:
+        method = Socket.CONNECT_METHODS.get(addr.type)
+        if method is None:
             raise NotImplementedError(f"unsupported address type: {addr}")
+        await getattr(self, method)(addr, timeout)
 
         self.stats["time_connect"] = int((time.time() - time_start) * 1000)
 
@@ -91,15 +102,33 @@ class Socket:
         fut = asyncio.open_connection(sock=sock)
         self._reader, self._writer = await asyncio.wait_for(fut, timeout=timeout)
 
+    @staticmethod
+    def _get_i2p_session_lock() -> asyncio.Lock:
+        """Return lock guarding I2P session creation. Create lock on first use."""
+        lock = Socket._i2p_session_lock
+        if lock is None:
+            lock = Socket._i2p_session_lock = asyncio.Lock()
+        return lock
+
     async def _get_i2p_session_id(self):
-        """Return I2P session. Create session if it does not exist yet."""
+        """
+        Return I2P session. Create session if it does not exist yet.
+
+        Concurrent connects wait for the session being created rather than
+        each creating their own.
+        """
         if Socket.i2p_session_id:
             return Socket.i2p_session_id
 
-        ns = self.network_settings
-        sid = i2plib.utils.generate_session_id()
-        await i2plib.create_session(sid, sam_address=(ns.i2p_sam_host, ns.i2p_sam_port))
-        Socket.i2p_session_id = sid
+        async with Socket._get_i2p_session_lock():
+            if Socket.i2p_session_id:
+                return Socket.i2p_session_id
+            ns = self.network_settings
+            sid = i2plib.utils.generate_session_id()
+            await i2plib.create_session(
+                sid, sam_address=(ns.i2p_sam_host, ns.i2p_sam_port)
+            )
+            Socket.i2p_session_id = sid
         return sid
 
     async def _connect_i2p(self, addr: Address, timeout: int):
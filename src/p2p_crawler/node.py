@@ -5,6 +5,7 @@ from __future__ import annotations
 import asyncio
 import logging as log
 import time
+from collections import Counter
 from dataclasses import asdict, dataclass, field
 from functools import cached_property
 from typing import ClassVar
@@ -15,6 +16,39 @@ from .network import Address, Socket
 from .protocol import (AddrMessage, AddrV2Message, GetAddrMessage,
                        SendAddrV2Message, VerAckMessage, VersionMessage)
 
+# network type to timeout settings mapping used by Node._timeouts
+TIMEOUT_NETWORKS = {
+    "ipv4": "ip",
+    "ipv6": "ip",
+    "onion_v2": "tor",
+    "onion_v3": "tor",
+    "i2p": "i2p",
+    "cjdns": "cjdns",
+}
+
+# (network type, stats key) pairs used by Node._create_address_statistics
+ADVERTISED_ADDRS_KEYS = tuple(
+    (net, f"advertised_addrs_{net}") for net in Address.supported_types
+)
+
+# stats reported by Node.get_stats(), with defaults for stats not recorded
+RELEVANT_STATS = {
+    "handshake_timestamp": None,
+    "time_connect": None,
+    "handshake_attempts": None,
+    "handshake_successful": None,
+    "handshake_duration": None,
+    "version": None,
+    "services": None,
+    "user_agent": None,
+    "latest_block": None,
+    "relay": None,
+    "version_reply_timestamp_remote": None,
+    "requested_addrs": False,
+    "advertised_addrs_total": 0,
+    **{key: 0 for _, key in ADVERTISED_ADDRS_KEYS},
+}
+
 
 @dataclass
 class Node:
@@ -45,15 +79,10 @@ class Node:
     @cached_property
     def _timeouts(self) -> TimeoutSettings:
         """Lazy-create timeouts."""
-        if self.address.is_ip:
-            return self.settings.timeouts["ip"]
-        if self.address.is_onion:
-            return self.settings.timeouts["tor"]
-        if self.address.is_i2p:
-            return self.settings.timeouts["i2p"]
-        if self.address.is_cjdns:
-            return self.settings.timeouts["cjdns"]
-        raise NotImplementedError("timeouts: unknown address type")
+        try:
+            return self.settings.timeouts[TIMEOUT_NETWORKS[self.address.type]]
+        except KeyError as e:
+            raise NotImplementedError("timeouts: unknown address type") from e
 
     def __str__(self):
         """Format node as string."""
@@ -64,8 +93,8 @@ class Node:
         return self.address == other.address
 
     def __hash__(self):
-        """Hash nodes by address."""
-        return hash(self.address)
+        """Hash nodes by address (using its precomputed hash)."""
+        return self.address._hash  # pylint: disable=protected-access
 
     @timing
     async def connect(self) -> bool:
@@ -106,9 +135,8 @@ class Node:
         message sent by the peer.
         """
 
-        self.stats["handshake_attempts"] = self.stats.get("handshake_attempts", 0) + 1
+        attempts = self.stats.get("handshake_attempts", 0) + 1
         time_start = time.time()
-        self.stats["handshake_timestamp"] = int(time_start)
         self._socket.send(VersionMessage())
 
         try:
@@ -118,22 +146,35 @@ class Node:
         except Exception as e:  # pylint: disable=broad-except
             log.debug(
                 "Handshake attempt %d/%d with node %s failed: %s",
-                self.stats["handshake_attempts"],
+                attempts,
                 self.settings.handshake_attempts,
                 self,
                 repr(e),
             )
-            self.stats["handshake_successful"] = False
+            self.stats.update(
+                {
+                    "handshake_attempts": attempts,
+                    "handshake_timestamp": int(time_start),
+                    "handshake_successful": False,
+                }
+            )
             return False
 
-        self.stats["handshake_successful"] = True
-        self.stats["handshake_duration"] = int((time.time() - time_start) * 1000)
+        duration = int((time.time() - time_start) * 1000)
+        self.stats.update(
+            {
+                "handshake_attempts": attempts,
+                "handshake_timestamp": int(time_start),
+                "handshake_successful": True,
+                "handshake_duration": duration,
+            }
+        )
         log.debug(
             "Handshake attempt %d/%d with node %s successful (duration: %dms)",
-            self.stats["handshake_attempts"],
+            attempts,
             self.settings.handshake_attempts,
             self,
-            self.stats["handshake_duration"],
+            duration,
         )
         self._socket.send(SendAddrV2Message())
         self._socket.send(VerAckMessage())
@@ -151,7 +192,7 @@ class Node:
         self.stats.update(data)
 
     @timing
-    async def get_peer_addrs(self) -> list[Address]:
+    async def get_peer_addrs(self) -> set[Address]:
         """Request and receive addresses from node.
 
         Send 'getaddr' message and receive multiple 'addr' or 'addrv2' messages
@@ -167,9 +208,8 @@ class Node:
             log.debug("Error sending getaddr message to %s: %s", self, repr(e))
 
         addresses = set()
-        start = int(time.time())
-        time_remaining = self._timeouts.getaddr
-        while time_remaining > 0:
+        deadline = time.monotonic() + self._timeouts.getaddr
+        while (time_remaining := deadline - time.monotonic()) > 0:
             timeout = min(time_remaining, self._timeouts.message)
             try:
                 msg = await self._socket.receive(
@@ -189,13 +229,11 @@ class Node:
                     repr(e),
                 )
                 break
-            addresses.update(set(msg.addresses))
-            time_remaining -= int(time.time() - start)
+            addresses.update(msg.addresses)
 
         self._create_address_statistics(addresses)
         return addresses
 
-    @timing
     def _create_address_statistics(self, addresses):
         """Create simple statistics for addresses received by node.
 
@@ -204,11 +242,10 @@ class Node:
           - number of addresses by network type
         """
 
+        counts = Counter(a.type for a in addresses)
         stats = {"advertised_addrs_total": len(addresses)}
-        for net in Address.supported_types:
-            stats[f"advertised_addrs_{net}"] = len(
-                [a for a in addresses if a.type == net]
-            )
+        for net, key in ADVERTISED_ADDRS_KEYS:
+            stats[key] = counts[net]
         self.stats.update(stats)
 
     def get_stats(self) -> dict[str, str | int | bool]:
@@ -229,32 +266,7 @@ class Node:
             "seed_distance": self.seed_distance,
         }
 
-        relevant_stats = [
-            "handshake_timestamp",
-            "time_connect",
-            "handshake_attempts",
-            "handshake_successful",
-            "handshake_duration",
-            "version",
-            "services",
-            "user_agent",
-            "latest_block",
-            "relay",
-            "version_reply_timestamp_remote",
-            "requested_addrs",
-            "advertised_addrs_total",
-            "advertised_addrs_ipv4",
-            "advertised_addrs_ipv6",
-            "advertised_addrs_onion_v2",
-            "advertised_addrs_onion_v3",
-            "advertised_addrs_i2p",
-            "advertised_addrs_cjdns",
-        ]
-        for stat in relevant_stats:
-            if stat == "requested_addrs":
-                stats[stat] = self.stats.get(stat, False)
-            elif stat.startswith("advertised_addrs_"):
-                stats[stat] = self.stats.get(stat, 0)
-            else:
-                stats[stat] = self.stats.get(stat, None)
+        node_stats = self.stats
+        for stat, default in RELEVANT_STATS.items():
+            stats[stat] = node_stats.get(stat, default)
         return stats
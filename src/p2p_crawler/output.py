@@ -1,22 +1,32 @@
 """Module for persisting crawler output."""
 
-import bz2
 import csv
-import json
+import io
 import logging as log
-import lzma
 import os
-import sys
+import shutil
+import tarfile
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
-from google.cloud import storage
+import orjson
+import zstandard as zstd
 
 from .address import Address
 from .config import LogSettings, ResultSettings
 from .crawler import Crawler
 
+ZSTD_LEVEL = 3
+# addr data is the largest output, so trade compression speed for ratio
+ZSTD_LEVEL_ADDR_DATA = 19
+COPY_BUFSIZE = 1024 * 1024  # 1 MiB
+GCS_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MiB
+GCS_PARALLEL_UPLOAD_THRESHOLD = 32 * 1024 * 1024  # 32 MiB
+GCS_PARALLEL_UPLOAD_WORKERS = 8
+
 
 @dataclass
 class Output:
@@ -27,43 +37,69 @@ class Output:
     crawler: Crawler
 
     @staticmethod
-    def lzma_compress_file(path_in: Path, delete_input: bool = True):
-        """Compress file using LZMA."""
-
-        time_start = time.time()
-        path_out = Path(f"{path_in}.xz")
-        with path_in.open("rb") as f_in:
-            with lzma.open(path_out, "wb") as f_out:
-                f_out.writelines(f_in)
-        runtime = time.time() - time_start
-        log.info(
-            "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
-            path_out,
-            path_out.stat().st_size / 1024,
-            path_in.stat().st_size / 1024,
-            path_in.stat().st_size / path_out.stat().st_size,
-            runtime,
-        )
-        if delete_input:
-            os.remove(path_in)
-            log.debug("Removed uncompressed input file %s", path_in)
+    def zstd_compressor(level: int = ZSTD_LEVEL) -> zstd.ZstdCompressor:
+        """Return a multi-threaded zstd compressor."""
+        return zstd.ZstdCompressor(level=level, threads=-1)
 
     @staticmethod
-    def dict_to_bz2(path: Path, data: dict):
-        """Write `data` to `path`."""
-        time_start = time.time()
-        data_bytes = json.dumps(data, indent=4, default=str).encode()
-        with bz2.open(path, "wb") as f:
-            f.write(data_bytes)
-        runtime = time.time() - time_start
-        log.info(
-            "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
-            path,
-            path.stat().st_size / 1024,
-            len(data_bytes) / 1024,
-            len(data_bytes) / path.stat().st_size,
-            runtime,
-        )
+    def zstd_compress_file(path_in: Path, level: int = ZSTD_LEVEL):
+        """Compress file using zstd, then remove the uncompressed input file."""
+
+        time_start = time.monotonic_ns()
+        path_out = Path(f"{path_in}.zst")
+        with open(path_in, "rb") as f_in, open(path_out, "wb") as f_out:
+            with Output.zstd_compressor(level).stream_writer(f_out) as writer:
+                shutil.copyfileobj(f_in, writer, COPY_BUFSIZE)
+        runtime = (time.monotonic_ns() - time_start) / 1e9
+        if log.getLogger().isEnabledFor(log.INFO):
+            size_in = path_in.stat().st_size
+            size_out = path_out.stat().st_size
+            log.info(
+                "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
+                path_out,
+                size_out / 1024,
+                size_in / 1024,
+                size_in / size_out,
+                runtime,
+            )
+        os.remove(path_in)
+        log.debug("Removed uncompressed input file %s", path_in)
+
+    @staticmethod
+    def dict_to_zst(path: Path, data: dict):
+        """
+        Write `data` to `path`.
+
+        Top-level entries are serialized and compressed one at a time, so the
+        full JSON document is never held in memory.
+        """
+
+        def dumps(obj) -> bytes:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+        time_start = time.monotonic_ns()
+        size_uncompressed = 0
+        with open(path, "wb") as f, Output.zstd_compressor().stream_writer(f) as writer:
+            separator = b"{"
+            for key, value in data.items():
+                chunk = separator + dumps(str(key)) + b":" + dumps(value)
+                writer.write(chunk)
+                size_uncompressed += len(chunk)
+                separator = b","
+            chunk = b"}" if data else b"{}"
+            writer.write(chunk)
+            size_uncompressed += len(chunk)
+        runtime = (time.monotonic_ns() - time_start) / 1e9
+        if log.getLogger().isEnabledFor(log.INFO):
+            size = path.stat().st_size
+            log.info(
+                "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
+                path,
+                size / 1024,
+                size_uncompressed / 1024,
+                size_uncompressed / size,
+                runtime,
+            )
 
     def persist(self):
         """
@@ -84,7 +120,9 @@ class Output:
         self.write_reachable_nodes()
         if self.crawler.settings.record_addr_data:
             self.write_addr_data_eof()
-            Output.lzma_compress_file(self.result_settings.addr_data)
+            Output.zstd_compress_file(
+                self.result_settings.addr_data, level=ZSTD_LEVEL_ADDR_DATA
+            )
         if self.log_settings.store_debug_log:
             self.compress_debug_log()
 
@@ -114,12 +152,13 @@ class Output:
             Includes total number of nodes, number of unknown nodes, and number of nodes of different network types.
             """
             networks = Address.supported_types
+            counts = Counter(n.address.type for n in nodes)
             result = {
                 "total": len(nodes),
-                "unknown": len([n for n in nodes if n.address.type not in networks]),
+                "unknown": len(nodes) - sum(counts[net] for net in networks),
             }
             for net in networks:
-                result[net] = len([n for n in nodes if n.address.type == net])
+                result[net] = counts[net]
             return result
 
         crawler_data = {
@@ -144,36 +183,47 @@ class Output:
             },
         }
 
-        dest = Path(f"{self.result_settings.crawler_stats}.bz2")
-        Output.dict_to_bz2(dest, crawler_data)
+        dest = Path(f"{self.result_settings.crawler_stats}.zst")
+        Output.dict_to_zst(dest, crawler_data)
 
     def write_reachable_nodes(self):
         """Write reachable nodes data as CSV. Order by handshake timestamp."""
-        time_start = time.time()
+        time_start = time.monotonic_ns()
 
-        reachable_nodes = [node.get_stats() for node in self.crawler.nodes.reachable]
+        # sort nodes rather than their stats, so stats dicts are created one at
+        # a time while writing instead of all being held in memory
+        reachable_nodes = sorted(
+            self.crawler.nodes.reachable,
+            key=lambda node: node.stats.get("handshake_timestamp"),
+        )
         if not reachable_nodes:
             log.warning("No reachable nodes found. Not writing reachable nodes CSV.")
             return
-        reachable_nodes.sort(key=lambda x: x["handshake_timestamp"])
 
-        dest = Path(f"{self.result_settings.reachable_nodes}.bz2")
-        with bz2.open(dest, "wt") as csv_compressed:
-            fieldnames = reachable_nodes[0].keys()
-            writer = csv.DictWriter(csv_compressed, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(reachable_nodes)
-
-        runtime = time.time() - time_start
-        size = sum(sys.getsizeof(node.values()) for node in reachable_nodes)
-        log.info(
-            "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
-            dest,
-            dest.stat().st_size / 1024,
-            size / 1024,
-            size / dest.stat().st_size,
-            runtime,
-        )
+        dest = Path(f"{self.result_settings.reachable_nodes}.zst")
+        compressor = Output.zstd_compressor()
+        with open(dest, "wb") as f_out, io.TextIOWrapper(
+            compressor.stream_writer(f_out), encoding="utf-8", newline=""
+        ) as csv_compressed:
+            # all rows share the key order of Node.get_stats(), so plain rows
+            # can be written instead of going through DictWriter
+            writer = csv.writer(csv_compressed)
+            writer.writerow(reachable_nodes[0].get_stats().keys())
+            writer.writerows(node.get_stats().values() for node in reachable_nodes)
+
+        runtime = (time.monotonic_ns() - time_start) / 1e9
+        if log.getLogger().isEnabledFor(log.INFO):
+            # number of uncompressed bytes fed to the compressor
+            size = compressor.frame_progression()[0]
+            size_compressed = dest.stat().st_size
+            log.info(
+                "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
+                dest,
+                size_compressed / 1024,
+                size / 1024,
+                size / size_compressed,
+                runtime,
+            )
 
     def compress_debug_log(self):
         """
@@ -186,28 +236,38 @@ class Output:
             if isinstance(handler, log.FileHandler):
                 handler.close()
 
-        path_in = self.log_settings.debug_log_path
-        path_out = Path(f"{path_in}.bz2")
-        time_start = time.time()
-        with open(path_in, "rb") as f_in:
-            with bz2.open(path_out, "wb") as f_out:
-                f_out.writelines(f_in)
-        runtime = time.time() - time_start
+        Output.zstd_compress_file(self.log_settings.debug_log_path)
+
+    @staticmethod
+    def bundle_files(path: Path, paths: list[Path]) -> Path:
+        """
+        Bundle files into a single tar archive.
+
+        The files are already compressed, so the archive itself is not.
+        """
+        time_start = time.monotonic_ns()
+        with tarfile.open(path, "w") as tar:
+            for p in paths:
+                tar.add(p, arcname=p.name)
+        runtime = (time.monotonic_ns() - time_start) / 1e9
         log.info(
-            "Wrote %s (size=%.1fkB, uncompressed=%.1fkB, ratio=%.1f, runtime=%.1fs)",
-            path_out,
-            path_out.stat().st_size / 1024,
-            path_in.stat().st_size / 1024,
-            path_in.stat().st_size / path_out.stat().st_size,
+            "Wrote %s (files=%d, size=%.1fkB, runtime=%.1fs)",
+            path,
+            len(paths),
+            path.stat().st_size / 1024,
             runtime,
         )
-        os.remove(path_in)
-        log.debug("Removed uncompressed debug log %s", path_in)
+        return path
 
     def upload_files_to_gcs(self):
         """Persist files to GCS."""
 
-        storage_client = storage.Client.from_service_account_json(
+        # imported here because the GCS client library is slow to import and
+        # only needed when storing to GCS
+        # pylint: disable-next=import-outside-toplevel
+        from google.cloud.storage import Client, transfer_manager
+
+        storage_client = Client.from_service_account_json(
             self.result_settings.gcs.credentials
         )
         bucket = storage_client.bucket(self.result_settings.gcs.bucket)
@@ -216,22 +276,34 @@ class Output:
             return path.with_suffix(path.suffix + suffix)
 
         paths = [
-            add_suffix(self.result_settings.reachable_nodes, ".bz2"),
-            add_suffix(self.result_settings.crawler_stats, ".bz2"),
+            add_suffix(self.result_settings.reachable_nodes, ".zst"),
+            add_suffix(self.result_settings.crawler_stats, ".zst"),
         ]
         if self.crawler.settings.record_addr_data:
-            paths.append(add_suffix(self.result_settings.addr_data, ".xz"))
+            paths.append(add_suffix(self.result_settings.addr_data, ".zst"))
         if self.log_settings.store_debug_log:
-            paths.append(add_suffix(self.log_settings.debug_log_path, ".bz2"))
+            paths.append(add_suffix(self.log_settings.debug_log_path, ".zst"))
+        if self.result_settings.gcs.bundle:
+            paths = [Output.bundle_files(self.result_settings.bundle, paths)]
 
-        for path in paths:
+        def upload(path: Path):
             blob_dest = self.result_settings.gcs.location + "/" + path.name
             blob = bucket.blob(blob_dest)
             # workaround for a GCS timeout issue when uploading large files
             # (see https://github.com/googleapis/python-storage/issues/74)
-            blob._chunk_size = 8 * 1024 * 1024  # 8 MB
+            blob.chunk_size = GCS_CHUNK_SIZE
             xfer_start = time.time()
-            blob.upload_from_filename(path)
+            if path.stat().st_size > GCS_PARALLEL_UPLOAD_THRESHOLD:
+                # upload chunks of large files (e.g., addr data) in parallel
+                transfer_manager.upload_chunks_concurrently(
+                    str(path),
+                    blob,
+                    chunk_size=GCS_CHUNK_SIZE,
+                    worker_type=transfer_manager.THREAD,
+                    max_workers=GCS_PARALLEL_UPLOAD_WORKERS,
+                )
+            else:
+                blob.upload_from_filename(path)
             log.info(
                 "Uploaded %s to gs://%s/%s in %dms",
                 path,
@@ -239,3 +311,7 @@ class Output:
                 blob_dest,
                 int((time.time() - xfer_start) * 1000),
             )
+
+        # uploads are I/O-bound, so upload all files concurrently
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            list(executor.map(upload, paths))
@@ -3,8 +3,9 @@ import asyncio
 import base64
 import logging as log
 import socket
+import struct
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from hashlib import sha3_256, sha256
 from io import BytesIO
 from ipaddress import IPv6Address
@@ -24,6 +25,34 @@ BIP_0155_NETWORK_IDS = {
     0x06: ["cjdns", 16],
 }
 
+IPV4_MAPPED_PREFIX = b"\x00" * 10 + b"\xff\xff"
+IPV4_COMPATIBLE_PREFIX = b"\x00" * 12
+
+# Onion v3 checksum is sha3_256(".onion checksum" + pubkey + version); the hash
+# state for the constant prefix is computed once and copied for each address
+TORV3_VERSION = b"\x03"
+TORV3_CHECKSUM_HASH = sha3_256(b".onion checksum")
+
+# envelope header: magic, command, payload size, checksum
+ENVELOPE_HEADER = struct.Struct("<4s12sI4s")
+# decoded commands by their raw (NULL-padded) bytes; bounded, since peers can
+# send arbitrary commands
+COMMANDS: dict[bytes, str] = {}
+MAX_COMMANDS = 64
+
+# precompiled layouts for parsing fields directly from message payloads
+UINT16_LE = struct.Struct("<H")
+UINT16_BE = struct.Struct(">H")
+UINT32_LE = struct.Struct("<I")
+UINT64_LE = struct.Struct("<Q")
+# addr record: timestamp, services (skipped), ip, port (big endian, swapped
+# after unpacking since struct formats cannot mix byte orders)
+ADDR_RECORD = struct.Struct("<I8x16sH")
+# version message: version, services, timestamp, receiver services
+VERSION_HEAD = struct.Struct("<IQQQ")
+# network address in version message: ip, port (big endian)
+NET_ADDR = struct.Struct(">16sH")
+
 
 class VarInt:
     """Class to handle Bitcoin varints."""
@@ -32,13 +61,25 @@ class VarInt:
     def decode(stream):
         """Decode Bitcoin varint."""
         i = stream.read(1)[0]
+        if i < 0xFD:
+            return i
         if i == 0xFD:
             return int.from_bytes(stream.read(2), "little")
         if i == 0xFE:
             return int.from_bytes(stream.read(4), "little")
-        if i == 0xFF:
-            return int.from_bytes(stream.read(8), "little")
-        return i
+        return int.from_bytes(stream.read(8), "little")
+
+    @staticmethod
+    def decode_from(buf, pos: int) -> tuple[int, int]:
+        """Decode Bitcoin varint at `pos` in `buf`; return value and new position."""
+        i = buf[pos]
+        if i < 0xFD:
+            return i, pos + 1
+        if i == 0xFD:
+            return UINT16_LE.unpack_from(buf, pos + 1)[0], pos + 3
+        if i == 0xFE:
+            return UINT32_LE.unpack_from(buf, pos + 1)[0], pos + 5
+        return UINT64_LE.unpack_from(buf, pos + 1)[0], pos + 9
 
     @staticmethod
     def encode(i):
@@ -73,6 +114,68 @@ def decode_user_agent(s):
     return user_agent
 
 
+def decode_ipv4(addr_data: bytes) -> str:
+    """Decode IPv4 address from its 4 bytes."""
+    return socket.inet_ntop(socket.AF_INET, addr_data)
+
+
+def decode_ipv6(addr_data: bytes) -> str:
+    """
+    Decode 16-byte IPv6 address; IPv4-mapped addresses are returned as IPv4.
+
+    inet_ntop() formats addresses the same way as `IPv6Address`, except for
+    the deprecated IPv4-compatible range (::/96), which is rare enough to be
+    left to `IPv6Address`.
+    """
+    prefix = addr_data[:12]
+    if prefix == IPV4_MAPPED_PREFIX:
+        return socket.inet_ntop(socket.AF_INET, addr_data[12:])
+    if prefix == IPV4_COMPATIBLE_PREFIX:
+        return str(IPv6Address(addr_data))
+    return socket.inet_ntop(socket.AF_INET6, addr_data)
+
+
+def decode_torv2(addr_data: bytes) -> str:
+    """Decode Onion v2 address from its 10-byte permanent id."""
+    return base64.b32encode(addr_data).decode("ascii").lower() + ".onion"
+
+
+def decode_torv3(addr_data: bytes) -> str:
+    """Decode Onion v3 address from its 32-byte public key."""
+    pubkey, version = addr_data, TORV3_VERSION
+    checksum_hash = TORV3_CHECKSUM_HASH.copy()
+    checksum_hash.update(pubkey + version)
+    checksum = checksum_hash.digest()[:2]
+    return (
+        base64.b32encode(pubkey + checksum + version).decode("ascii").lower() + ".onion"
+    )
+
+
+def decode_i2p(addr_data: bytes) -> str:
+    """Decode I2P address from its 32-byte hash."""
+    return (
+        base64.b32encode(addr_data).decode("ascii").lower().replace("=", "")
+        + ".b32.i2p"
+    )
+
+
+def decode_cjdns(addr_data: bytes) -> str:
+    """Decode CJDNS address from its 16 bytes."""
+    return socket.inet_ntop(socket.AF_INET6, addr_data)
+
+
+# addrv2 network type to decoder mapping, so each address is decoded with a
+# single lookup instead of a chain of comparisons
+ADDRV2_DECODERS = {
+    "ipv4": decode_ipv4,
+    "ipv6": decode_ipv6,
+    "torv2": decode_torv2,
+    "torv3": decode_torv3,
+    "i2p": decode_i2p,
+    "cjdns": decode_cjdns,
+}
+
+
 def hash256(message):
     """Compute double-SHA256 hash."""
     return sha256(sha256(message).digest()).digest()
@@ -103,13 +206,16 @@ class NetworkEnvelope:
     @classmethod
     async def parse(cls, s):
         """Deserialize network message envelope."""
-        magic = await s.readexactly(4)
+        header = await s.readexactly(ENVELOPE_HEADER.size)
+        magic, command_raw, payload_size, checksum = ENVELOPE_HEADER.unpack(header)
         if magic != MAINNET_NETWORK_MAGIC:
             log.error("Wrong magic: %s", magic.hex())
-        command = (await s.readexactly(12)).rstrip(b"\x00").decode("ASCII")
-        payload_size = int.from_bytes(await s.readexactly(4), "little")
-        checksum = await s.readexactly(4)
-        payload = await s.readexactly(payload_size)
+        command = COMMANDS.get(command_raw)
+        if command is None:
+            command = command_raw.rstrip(b"\x00").decode("ASCII")
+            if len(COMMANDS) < MAX_COMMANDS:
+                COMMANDS[command_raw] = command
+        payload = await s.readexactly(payload_size) if payload_size else b""
         expected_checksum = hash256(payload)[:4]
         if checksum != expected_checksum:
             log.error(
@@ -122,12 +228,14 @@ class NetworkEnvelope:
 
     def serialize(self):
         """Serialize network message envelope."""
-        ser = self.magic
-        ser += self.command.encode("ASCII") + b"\00" * (12 - len(self.command))
-        ser += len(self.payload).to_bytes(4, "little")
-        ser += hash256(self.payload)[:4]
-        ser += self.payload
-        return ser
+        # struct pads the command with NULL bytes
+        header = ENVELOPE_HEADER.pack(
+            self.magic,
+            self.command.encode("ASCII"),
+            len(self.payload),
+            hash256(self.payload)[:4],
+        )
+        return header + self.payload
 
     def stream(self):
         """Return a stream to the payload."""
@@ -164,14 +272,14 @@ class VersionMessage:  # pylint: disable=too-many-instance-attributes
     command: ClassVar[str] = "version"
     version: int = 70015
     services: int = 0  # 1033 for NODE_NETWORK, NODE_SEGWIT, NODE_NETWORK_LIMITED
-    timestamp: int = int(time.time())
+    timestamp: int = field(default_factory=lambda: int(time.time()))
     receiver_services: int = 0
     receiver_ip: IPv6Address = IPv6Address("::ffff:0.0.0.0")
     receiver_port: int = 0
     sender_services: int = 0
     sender_ip: IPv6Address = IPv6Address("::ffff:0.0.0.0")
     sender_port: int = 0
-    nonce: int = randint(0, 2**64)
+    nonce: int = field(default_factory=lambda: randint(0, 2**64 - 1))
     user_agent: str = "/Satoshi:23.0.0/"
     latest_block: int = 0
     relay: bool = False
@@ -180,12 +288,11 @@ class VersionMessage:  # pylint: disable=too-many-instance-attributes
     def parse(cls, s):  # pylint: disable=too-many-locals
         """Deserialize version message."""
 
-        version = int.from_bytes(s.read(4), "little")
-        services = int.from_bytes(s.read(8), "little")
-        timestamp = int.from_bytes(s.read(8), "little")
-        receiver_services = int.from_bytes(s.read(8), "little")
-        receiver_ip = IPv6Address(s.read(16))
-        receiver_port = int.from_bytes(s.read(2), "big")
+        version, services, timestamp, receiver_services = VERSION_HEAD.unpack(
+            s.read(VERSION_HEAD.size)
+        )
+        receiver_ip, receiver_port = NET_ADDR.unpack(s.read(NET_ADDR.size))
+        receiver_ip = IPv6Address(receiver_ip)
         if version < 106:
             return cls(
                 version,
@@ -196,11 +303,12 @@ class VersionMessage:  # pylint: disable=too-many-instance-attributes
                 receiver_port,
             )
 
-        sender_services = int.from_bytes(s.read(8), "little")
-        sender_ip = IPv6Address(s.read(16))
-        sender_port = int.from_bytes(s.read(2), "big")
-        nonce = int.from_bytes(s.read(8), "little")
+        sender_services = UINT64_LE.unpack(s.read(8))[0]
+        sender_ip, sender_port = NET_ADDR.unpack(s.read(NET_ADDR.size))
+        sender_ip = IPv6Address(sender_ip)
+        nonce = UINT64_LE.unpack(s.read(8))[0]
         user_agent = decode_user_agent(s)
+        # some implementations omit trailing fields, so short reads are tolerated
         latest_block = int.from_bytes(s.read(4), "little")
         if version < 70001:
             return cls(
@@ -237,21 +345,22 @@ class VersionMessage:  # pylint: disable=too-many-instance-attributes
 
     def serialize(self):
         """Serialize version message."""
-        ser = self.version.to_bytes(4, "little")
-        ser += self.services.to_bytes(8, "little")
-        ser += self.timestamp.to_bytes(8, "little")
-        ser += self.receiver_services.to_bytes(8, "little")
-        ser += self.receiver_ip.packed
-        ser += self.receiver_port.to_bytes(2, "big")
-        ser += self.sender_services.to_bytes(8, "little")
-        ser += self.sender_ip.packed
-        ser += self.sender_port.to_bytes(2, "big")
-        ser += self.nonce.to_bytes(8, "little")
-        ser += VarInt.encode(len(self.user_agent))
-        ser += self.user_agent.encode("UTF-8")
-        ser += self.latest_block.to_bytes(4, "little")
-        ser += b"\x01" if self.relay else b"\x00"  # 01 for relay, 00 for no relay
-        return ser
+        user_agent = self.user_agent.encode("UTF-8")
+        return b"".join(
+            (
+                VERSION_HEAD.pack(
+                    self.version, self.services, self.timestamp, self.receiver_services
+                ),
+                NET_ADDR.pack(self.receiver_ip.packed, self.receiver_port),
+                UINT64_LE.pack(self.sender_services),
+                NET_ADDR.pack(self.sender_ip.packed, self.sender_port),
+                UINT64_LE.pack(self.nonce),
+                VarInt.encode(len(user_agent)),
+                user_agent,
+                UINT32_LE.pack(self.latest_block),
+                b"\x01" if self.relay else b"\x00",  # 01 for relay, 00 for no relay
+            )
+        )
 
 
 class SimpleMessage:
@@ -371,14 +480,16 @@ class AddrMessage:
             log.info("Error deserializing number of addresses in addr message")
             return []
 
+        # records have a fixed size, so unpack them all at once
+        records = s.read(num_addresses * ADDR_RECORD.size)
+        if len(records) != num_addresses * ADDR_RECORD.size:
+            raise ValueError(
+                f"addr message truncated: expected {num_addresses} addresses"
+            )
         addresses = []
-        for _ in range(num_addresses):
-            timestamp = int.from_bytes(s.read(4), "little")
-            _ = s.read(8)
-            ip = IPv6Address(s.read(16))
-            ip_str = str(ip.ipv4_mapped) if ip.ipv4_mapped else str(ip)
-            port = int.from_bytes(s.read(2), "big")
-            addresses.append(Address(ip_str, port, timestamp))
+        for timestamp, ip, port in ADDR_RECORD.iter_unpack(records):
+            port = ((port & 0xFF) << 8) | (port >> 8)
+            addresses.append(Address(decode_ipv6(ip), port, timestamp))
         return cls(addresses)
 
 
@@ -404,56 +515,37 @@ class AddrV2Message:
     @staticmethod
     def decode_address(addr_type, addr_data) -> str:
         """Decode address data according to network type."""
-        if addr_type == "ipv4":
-            return socket.inet_ntop(socket.AF_INET, addr_data)
-
-        if addr_type == "ipv6":
-            ip = IPv6Address(addr_data)
-            return str(ip.ipv4_mapped) if ip.ipv4_mapped else str(ip)
-
-        if addr_type == "torv2":
-            permanent_id = addr_data
-            return base64.b32encode(permanent_id).decode("ascii").lower() + ".onion"
-
-        if addr_type == "torv3":
-            pubkey, version = addr_data, b"\x03"
-            checksum = sha3_256(
-                str.encode(".onion checksum") + pubkey + version
-            ).digest()[:2]
-            return (
-                base64.b32encode(pubkey + checksum + version).decode("ascii").lower()
-                + ".onion"
-            )
-
-        if addr_type == "i2p":
-            return (
-                base64.b32encode(addr_data).decode("ascii").lower().replace("=", "")
-                + ".b32.i2p"
-            )
-
-        if addr_type == "cjdns":
-            addr = socket.inet_ntop(socket.AF_INET6, addr_data)
-            return addr
-
-        raise ValueError("decode_address(): unsupported address type")
+        try:
+            decode = ADDRV2_DECODERS[addr_type]
+        except KeyError as e:
+            raise ValueError("decode_address(): unsupported address type") from e
+        return decode(addr_data)
 
     @staticmethod
-    def extract_address(stream) -> Address:
-        """Extract a single address from addrv2 message."""
-        timestamp = int.from_bytes(stream.read(4), "little")
-        _ = VarInt.decode(stream)
-        network_id = int.from_bytes(stream.read(1), byteorder="big", signed=False)
+    def extract_address(buf, pos: int) -> tuple[Address, int]:
+        """
+        Extract a single address at `pos` in addrv2 message payload `buf`.
+
+        Returns the address and the position of the next address.
+        """
+        timestamp = UINT32_LE.unpack_from(buf, pos)[0]
+        _, pos = VarInt.decode_from(buf, pos + 4)
+        network_id = buf[pos]
         addr_type, exp_addr_size = BIP_0155_NETWORK_IDS[network_id]
-        act_addr_size = VarInt.decode(stream)
+        decode = ADDRV2_DECODERS[addr_type]
+        act_addr_size, pos = VarInt.decode_from(buf, pos + 1)
         if act_addr_size != exp_addr_size:
             raise ValueError(
                 f"addr size inconsistency: network_id={network_id}, "
                 f"addr_type={addr_type}, expected_size={exp_addr_size}, actual_size={act_addr_size}"
             )
-        addr_data = stream.read(act_addr_size)
-        addr = AddrV2Message.decode_address(addr_type, addr_data)
-        port = int.from_bytes(stream.read(2), "big")
-        return Address(addr, port, timestamp)
+        end = pos + act_addr_size
+        addr_data = buf[pos:end]
+        if len(addr_data) != act_addr_size:
+            raise ValueError(f"addr data truncated: addr_type={addr_type}")
+        addr = decode(addr_data)
+        port = UINT16_BE.unpack_from(buf, end)[0]
+        return Address(addr, port, timestamp), end + 2
 
     @classmethod
     def parse(cls, stream):
@@ -464,11 +556,14 @@ class AddrV2Message:
             log.info("error parsing addrv2 msg (num_addresses): got 0 addresses")
             return []
 
+        # parse remaining payload by offset rather than reading field by field
+        buf = stream.read()
+        pos = 0
         addresses = []
         for _ in range(num_addresses):
             try:
-                address = AddrV2Message.extract_address(stream)
-            except (asyncio.IncompleteReadError, KeyError, ValueError) as e:
+                address, pos = AddrV2Message.extract_address(buf, pos)
+            except (IndexError, KeyError, ValueError, struct.error) as e:
                 log.info(
                     "error parsing addrv2 msg: %s (%s): got %d/%d addresses",
                     e,
@@ -9,6 +9,8 @@ import sys
 import time
 from pathlib import Path
 
+import uvloop
+
 from .config import LogSettings, Settings, parse_args
 from .crawler import Crawler
 from .output import Output
@@ -57,6 +59,40 @@ def sanity_check_settings(settings):
         print(f"[INFO] created result path {p}.")
 
 
+DEBUG_LOG_BUFSIZE = 1024 * 1024  # 1 MiB
+
+
+class BufferedFileHandler(log.FileHandler):
+    """
+    File handler that does not flush after every record.
+
+    The file is opened with a large write buffer, which is only flushed when
+    full, after records of level WARNING or higher, and when the handler is
+    closed. This avoids one write syscall per debug log record.
+    """
+
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=DEBUG_LOG_BUFSIZE,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
+
+    def emit(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= log.WARNING:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+
 def init_logger(settings: LogSettings):
     """Initilize the logger. Use UTC-based timestamps and log to file if requested."""
 
@@ -73,7 +109,7 @@ def init_logger(settings: LogSettings):
     root_logger.addHandler(console_handler)
 
     if settings.store_debug_log:
-        file_handler = log.FileHandler(settings.debug_log_path)
+        file_handler = BufferedFileHandler(settings.debug_log_path)
         file_handler.setFormatter(log_fmt)
         file_handler.setLevel(log.DEBUG)
         root_logger.addHandler(file_handler)
@@ -105,6 +141,7 @@ def main():
 
     settings = init()
     crawler = Crawler(settings.crawler_settings)
+    uvloop.install()
     asyncio.run(crawler.run())
     Output(settings.result_settings, settings.log_settings, crawler).persist()
 
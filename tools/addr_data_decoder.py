@@ -3,29 +3,41 @@
 """Decode addr data from a p2p-address-data file."""
 
 import argparse
-import io
 import lzma
-import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
 import time
+from array import array
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from functools import cached_property
 from pathlib import Path
-from typing import ClassVar, Optional
+from typing import BinaryIO, ClassVar, Iterator, Optional
+
+# network names, indexed by network ID
+NETWORKS = ("ipv4", "ipv6", "onion_v2", "onion_v3", "i2p", "cjdns")
 
 
 @dataclass
 class Address:
     """Class representing an address."""
 
+    # dataclass(slots=True) requires Python 3.10
+    __slots__ = ("id", "last_seen", "net_id", "network")
+
     id: int
     last_seen: int
     net_id: int
 
     def __post_init__(self):
-        networks = ["ipv4", "ipv6", "onion_v2", "onion_v3", "i2p", "cjdns"]
-        if not 0 <= self.net_id < len(networks):
-            raise ValueError(f"Invalid network ID: {self.net_id}")
-        self.network = networks[self.net_id]
+        # network IDs are decoded from unsigned fields, so only the upper
+        # bound needs checking
+        try:
+            self.network = NETWORKS[self.net_id]
+        except IndexError as e:
+            raise ValueError(f"Invalid network ID: {self.net_id}") from e
 
     def __repr__(self):
         return (
@@ -33,6 +45,38 @@ class Address:
         )
 
 
+@dataclass
+class AddrRecords:
+    """
+    Address records sent by a node.
+
+    Records are stored column-wise in typed arrays rather than as one
+    `Address` object each, which would take up several hundred bytes per
+    record. `Address` objects are created on access.
+    """
+
+    ids: array = field(default_factory=lambda: array("q"))
+    last_seen: array = field(default_factory=lambda: array("q"))
+    net_ids: array = field(default_factory=lambda: array("B"))
+
+    @classmethod
+    def allocate(cls, size: int) -> "AddrRecords":
+        """Create records with space for `size` addresses allocated up front."""
+        return cls(
+            array("q", [0]) * size, array("q", [0]) * size, array("B", [0]) * size
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> Address:
+        return Address(self.ids[i], self.last_seen[i], self.net_ids[i])
+
+    def __iter__(self) -> Iterator[Address]:
+        for addr_id, last_seen, net_id in zip(self.ids, self.last_seen, self.net_ids):
+            yield Address(addr_id, last_seen, net_id)
+
+
 @dataclass
 class AddrData:
     """Decoder for p2p-crawler address data."""
@@ -40,20 +84,101 @@ class AddrData:
     file: Path
 
     _epoch_offset: Optional[int] = field(init=False, default=None)
+    _chunks: Optional[queue.Queue] = field(init=False, default=None)
+    _data: bytearray = field(init=False, default_factory=bytearray)
+    _pos: int = field(init=False, default=0)
 
     HEADER_MAGIC: ClassVar[str] = "p2p-addr-data"
     HEADER_VERSION: ClassVar[int] = 1
     EOF_MARKER: ClassVar[bytes] = "EOF".encode("ASCII")
+    READ_SIZE: ClassVar[int] = 1024 * 1024
+    QUEUE_SIZE: ClassVar[int] = 4
+    ZSTD_MAGIC: ClassVar[bytes] = b"\x28\xb5\x2f\xfd"
+
+    @contextmanager
+    def _open(self) -> Iterator[BinaryIO]:
+        """
+        Open input file for reading decompressed data.
+
+        Files are zstd-compressed; files written by older crawler versions are
+        xz-compressed. Detect which one by the magic bytes. Decompress xz
+        files using the multi-threaded `xz` binary if available; otherwise,
+        fall back to the (single-threaded) lzma module.
+        """
+        with open(self.file, "rb") as f:
+            magic = f.read(len(AddrData.ZSTD_MAGIC))
+        if magic == AddrData.ZSTD_MAGIC:
+            # imported here so xz-compressed files can be read without zstandard
+            import zstandard  # pylint: disable=import-outside-toplevel
+
+            with zstandard.ZstdDecompressor().stream_reader(open(self.file, "rb")) as f:
+                yield f
+            return
+
+        xz = shutil.which("xz")
+        if xz is None:
+            with lzma.open(self.file, "rb") as f:
+                yield f
+            return
+
+        cmd = [xz, "--threads=0", "--decompress", "--stdout", str(self.file)]
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+            yield proc.stdout
+        if proc.returncode != 0:
+            raise IOError(
+                f"xz failed to decompress input file (status={proc.returncode})"
+            )
+
+    def _decompress(self):
+        """
+        Decompress input file into the chunk queue (runs in background thread).
+
+        Decompression releases the GIL, so it runs in parallel to decoding.
+        `None` marks the end of the file; exceptions are passed on to the
+        decoder.
+        """
+        chunks = self._chunks
+        try:
+            with self._open() as f:
+                while chunk := f.read(AddrData.READ_SIZE):
+                    chunks.put(chunk)
+        except Exception as e:  # pylint: disable=broad-except
+            chunks.put(e)
+            return
+        chunks.put(None)
+
+    def _fill(self, size: int) -> bool:
+        """
+        Buffer decompressed chunks until at least `size` bytes are available.
+
+        Bytes before the current position have been consumed and are dropped
+        first, so only a small window of the decompressed file is kept in
+        memory. Return false if the input file ends before `size` bytes are
+        available.
+        """
+        data = self._data
+        del data[: self._pos]
+        self._pos = 0
+        while len(data) < size:
+            if self._chunks is None:
+                return False
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._chunks = None
+                return False
+            if isinstance(chunk, Exception):
+                raise chunk
+            data += chunk
+        return True
 
-    @cached_property
-    def _buf(self):
-        """Read and decompress input file."""
-        time_start = time.time()
-        with lzma.open(self.file, "rb") as f:
-            data = f.read()
-        elapsed = time.time() - time_start
-        print(f"Decompressed input file '{self.file}' in {elapsed:.2f}s.")
-        return io.BytesIO(data)
+    def read(self, size: int) -> bytes:
+        """Read `size` bytes and advance position."""
+        pos = self._pos
+        if pos + size > len(self._data):
+            self._fill(size)
+            pos = 0
+        self._pos = pos + size
+        return self._data[pos : pos + size]
 
     @staticmethod
     def decode_zigzag(value: int) -> int:
@@ -62,27 +187,28 @@ class AddrData:
 
     def eof(self):
         """Check for end of file."""
-        maybe_eof_marker = self._buf.read(len(AddrData.EOF_MARKER))
-        if maybe_eof_marker != AddrData.EOF_MARKER:
-            self._buf.seek(-len(AddrData.EOF_MARKER), os.SEEK_CUR)
+        if len(self._data) - self._pos < len(AddrData.EOF_MARKER):
+            self._fill(len(AddrData.EOF_MARKER))
+        if not self._data.startswith(AddrData.EOF_MARKER, self._pos):
             return False
+        self._pos += len(AddrData.EOF_MARKER)
         print("Reached end of file.")
         return True
 
     def check_header(self):
         """Read and verify file header."""
-        magic = self._buf.read(len(AddrData.HEADER_MAGIC)).decode("ASCII")
+        magic = self.read(len(AddrData.HEADER_MAGIC)).decode("ASCII")
         if magic != AddrData.HEADER_MAGIC:
             raise ValueError(f"Invalid file magic: {magic}")
 
-        version = int.from_bytes(self._buf.read(1), "big")
+        version = int.from_bytes(self.read(1), "big")
         if version != AddrData.HEADER_VERSION:
             raise ValueError(f"Unsupported file version: {version}")
 
-        epoch = int.from_bytes(self._buf.read(4), "big")
+        epoch = int.from_bytes(self.read(4), "big")
         self._epoch_offset = epoch
 
-        terminator = self._buf.read(1).decode("ASCII")
+        terminator = self.read(1).decode("ASCII")
         if terminator != "\n":
             raise ValueError(f"Invalid header terminator: {terminator}")
 
@@ -90,48 +216,69 @@ class AddrData:
 
     def read_varint(self) -> int:
         """Read and decode variable length integer."""
-        shift = 0
-        result = 0
         while True:
-            byte = self._buf.read(1)
-            if not byte:
-                raise IOError("Unexpected end of stream while reading varint")
-            byte = ord(byte)
-            result |= (byte & 0x7F) << shift
-            if not byte & 0x80:
-                break
-            shift += 7
-        return result
+            data = self._data
+            pos = self._pos
+            try:
+                byte = data[pos]
+                # fast path: single-byte varint
+                if byte < 0x80:
+                    self._pos = pos + 1
+                    return byte
+                result = byte & 0x7F
+                shift = 7
+                pos += 1
+                while (byte := data[pos]) & 0x80:
+                    result |= (byte & 0x7F) << shift
+                    shift += 7
+                    pos += 1
+                self._pos = pos + 1
+                return result | (byte << shift)
+            except IndexError:
+                # varint extends past the buffered data: read more and retry
+                if not self._fill(len(data) - self._pos + 1):
+                    raise IOError(
+                        "Unexpected end of stream while reading varint"
+                    ) from None
 
     def decode(self):
         """Decode input file."""
         time_start = time.time()
 
+        self._chunks = queue.Queue(maxsize=AddrData.QUEUE_SIZE)
+        threading.Thread(target=self._decompress, daemon=True).start()
         self.check_header()
 
+        read_varint = self.read_varint
+        epoch = self._epoch_offset
         result = {}
         while not self.eof():
-            node_len = self.read_varint()
-            node = self._buf.read(node_len).decode("ascii").strip()
-            result[node] = []
-
-            num_records = self.read_varint()
+            node_len = read_varint()
+            node = self.read(node_len).decode("ascii").strip()
+
+            num_records = read_varint()
+            records = result[node] = AddrRecords.allocate(num_records)
+            ids = records.ids
+            last_seen = records.last_seen
+            net_ids = records.net_ids
             for i in range(num_records):
-                addr_net_id = self.read_varint()
-                addr_id = addr_net_id >> 3
-                net_id = addr_net_id & 0x07
+                addr_net_id = read_varint()
+                ids[i] = addr_net_id >> 3
+                net_ids[i] = addr_net_id & 0x07
 
-                lastseen_delta_zigzag = self.read_varint()
-                lastseen_delta = AddrData.decode_zigzag(lastseen_delta_zigzag)
-                lastseen = self._epoch_offset - lastseen_delta
+                # zigzag-decode (see decode_zigzag()) inline to save a call
+                lastseen_delta = read_varint()
+                lastseen_delta = (lastseen_delta >> 1) ^ -(lastseen_delta & 1)
+                last_seen[i] = epoch - lastseen_delta
 
-                result[node].append(Address(addr_id, lastseen, net_id))
+            if len(result) & 0x3FF == 0:
+                elapsed = time.time() - time_start
+                print(f"decoded={len(result)}, elapsed={elapsed:.1f}s")
 
-                if len(result) % 1000 == 0 and i == num_records - 1:
-                    elapsed = time.time() - time_start
-                    print(f"decoded={len(result)}, elapsed={elapsed:.1f}s")
+            if records.net_ids and max(records.net_ids) >= len(NETWORKS):
+                raise ValueError(f"Invalid network ID: {max(records.net_ids)}")
 
-            if self._buf.read(1) != b"\n":
+            if self.read(1) != b"\n":
                 raise ValueError("Record not properly terminated with newline")
 
         elapsed = time.time() - time_start
@@ -143,11 +290,15 @@ class AddrData:
 def inspect(data: dict):
     """Inspect data."""
 
+    write = sys.stdout.write
     for i, (node, addr_records) in enumerate(data.items()):
-        print(f"record={i}, node={node}, addr_recs=", end="")
-        for j in range(min(3, len(addr_records))):
-            print(f"{addr_records[j]}, ", end="")
-        print(" (cropped to at most three records)")
+        records = "".join(
+            f"{addr_records[j]}, " for j in range(min(3, len(addr_records)))
+        )
+        write(
+            f"record={i}, node={node}, addr_recs={records} "
+            "(cropped to at most three records)\n"
+        )
 
 
 def main():
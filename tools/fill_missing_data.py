@@ -12,9 +12,39 @@ import datetime as dt
 import os
 import shutil
 import sys
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from itertools import repeat
 from pathlib import Path
-from typing import ClassVar, List
+from typing import ClassVar, List, Tuple
+
+# number of missing outputs filled concurrently
+COPY_WORKERS = 4
+
+# timestamp format used in output file names
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H-%M-%SZ"
+
+
+def parse_timestamp(timestamp_str: str) -> dt.datetime:
+    """
+    Parse a timestamp formatted using TIMESTAMP_FORMAT.
+
+    The format is fixed-width, so fields are sliced directly, which is much
+    faster than datetime.strptime. Raise ValueError for malformed timestamps.
+    """
+    s = timestamp_str
+    if len(s) != 20 or s[4::3] != "--T--Z":
+        raise ValueError(f"Malformed timestamp: {s}")
+    return dt.datetime(
+        int(s[0:4]),
+        int(s[5:7]),
+        int(s[8:10]),
+        int(s[11:13]),
+        int(s[14:16]),
+        int(s[17:19]),
+    )
 
 
 @dataclass
@@ -22,18 +52,20 @@ class CrawlerOutput:
     """Class representing output files created by the crawler."""
 
     FILES: ClassVar[List[str]] = [
-        "reachable_nodes.csv.bz2",
-        "crawler_stats.json.bz2",
-        "debug_log.txt.bz2",
+        "reachable_nodes.csv",
+        "crawler_stats.json",
+        "debug_log.txt",
     ]
+    # compression suffixes of the files (runs by older versions used bz2)
+    SUFFIXES: ClassVar[Tuple[str, ...]] = (".zst", ".bz2")
     path: Path
     timestamp: dt.datetime
+    file_list: List[str]  # names of the files matching the timestamp
 
     def __post_init__(self):
         """Assert none of the expected files are missing."""
-        # Get list of files matching the timestamp
-        timestamp_str = self.timestamp.strftime("%Y-%m-%dT%H-%M-%SZ")
-        file_list = [f for f in os.listdir(self.path) if f.startswith(timestamp_str)]
+        self.timestamp_str = timestamp_str = self.timestamp.strftime(TIMESTAMP_FORMAT)
+        file_list = self.file_list
 
         # Make sure there's only one version, then set version
         versions = {f.split("_")[1] for f in file_list}
@@ -41,9 +73,15 @@ class CrawlerOutput:
             raise ValueError(f"Expecting exactly one version. Found: {versions}")
         self.version = versions.pop()
 
+        # Make sure the run uses only one compression format, then set suffix
+        suffixes = {s for f in file_list for s in self.SUFFIXES if f.endswith(s)}
+        if len(suffixes) != 1:
+            raise ValueError(f"Expecting exactly one suffix. Found: {suffixes}")
+        self.suffix = suffixes.pop()
+
         # Check for exact match of the expected files and number
         expected_files = [
-            f"{timestamp_str}_{self.version}_{suffix}" for suffix in self.FILES
+            f"{timestamp_str}_{self.version}_{file}{self.suffix}" for file in self.FILES
         ]
         for expected_file in expected_files:
             if expected_file not in file_list:
@@ -60,41 +98,67 @@ class MissingOutput:
     date: dt.date
     source: CrawlerOutput
 
+    def __post_init__(self):
+        """Format timestamp used for the filled-in files."""
+        timestamp = dt.datetime.combine(self.date, self.MARKER)
+        self.timestamp_str = timestamp.strftime(TIMESTAMP_FORMAT)
+
     def fill(self, path: Path):
-        """Fill in missing data by copying files from the source timestamp to the missing date."""
-        src_base = f"{str(path)}/{self.source.timestamp.strftime('%Y-%m-%dT%H-%M-%SZ')}_{self.source.version}_"
-        dst_timestamp = dt.datetime.combine(self.date, self.MARKER)
-        dst_base = f"{str(path)}/{dst_timestamp.strftime('%Y-%m-%dT%H-%M-%SZ')}_{self.source.version}_"
+        """
+        Fill in missing data by copying files from the source timestamp to the missing date.
+
+        Files are hard-linked rather than copied if possible, which takes no
+        additional disk space or I/O. Fall back to copying if linking fails
+        (e.g., across file systems or if the file system lacks support).
+        """
+        version = self.source.version
+        src_base = f"{path}/{self.source.timestamp_str}_{version}_"
+        dst_base = f"{path}/{self.timestamp_str}_{version}_"
         for file in self.source.FILES:
-            src = src_base + file
-            dst = dst_base + file
-            print(f"Copying {src} to {dst}")
-            shutil.copyfile(src, dst)
+            src = src_base + file + self.source.suffix
+            dst = dst_base + file + self.source.suffix
+            try:
+                os.link(src, dst)
+                action = "Linked"
+            except OSError:
+                shutil.copyfile(src, dst)
+                action = "Copied"
+            # single write, so lines from concurrent fills do not interleave
+            sys.stdout.write(f"{action} {src} to {dst}\n")
 
 
 def get_outputs(path: Path) -> List[CrawlerOutput]:
     """
     Find all runs in the given directory.
 
-    First, collect all unique timestamps of bz2 files. Next, initialize
+    First, collect all unique timestamps of zst and bz2 files, indexing all
+    files by their timestamp prefix in the same pass. Next, initialize
     CrawlerOutput objects, which automatically assert that all of the expected
     output files exist; then return the list of runs.
     """
 
-    timestamps = set()
-    for f in path.iterdir():
-        if not f.is_file() or f.suffix != ".bz2":
-            continue
-        try:
-            timestamp_str = f.name.split("_")[0]
-            timestamp = dt.datetime.strptime(timestamp_str, "%Y-%m-%dT%H-%M-%SZ")
-        except ValueError:
-            print(f"Could not parse timestamp of file '{f}'. Skipping.")
-            continue
-        timestamps.add(timestamp)
+    timestamps = {}
+    files_by_timestamp = defaultdict(list)
+    with os.scandir(path) as entries:
+        for f in entries:
+            timestamp_str = f.name.partition("_")[0]
+            files_by_timestamp[timestamp_str].append(f.name)
+            if not f.name.endswith(CrawlerOutput.SUFFIXES) or not f.is_file():
+                continue
+            if timestamp_str in timestamps:
+                continue
+            try:
+                timestamp = parse_timestamp(timestamp_str)
+            except ValueError:
+                print(f"Could not parse timestamp of file '{f.path}'. Skipping.")
+                continue
+            timestamps[timestamp_str] = timestamp
     print(f"Found {len(timestamps)} unique timestamps.")
 
-    outputs = [CrawlerOutput(path, timestamp) for timestamp in timestamps]
+    outputs = [
+        CrawlerOutput(path, timestamp, files_by_timestamp[timestamp_str])
+        for timestamp_str, timestamp in timestamps.items()
+    ]
     print(f"Found {len(outputs)} valid runs.")
     return outputs
 
@@ -102,19 +166,29 @@ def get_outputs(path: Path) -> List[CrawlerOutput]:
 def find_missing_outputs(outputs: List[CrawlerOutput]) -> List[MissingOutput]:
     """Find missing runs."""
 
-    date_start = min(outputs, key=lambda x: x.timestamp).timestamp.date()
-    date_end = max(outputs, key=lambda x: x.timestamp).timestamp.date()
+    outputs = sorted(outputs, key=lambda x: x.timestamp)
+    timestamps = [output.timestamp for output in outputs]
+    date_start = timestamps[0].date()
+    date_end = timestamps[-1].date()
     date_range = [
         date_start + dt.timedelta(days=x)
         for x in range((date_end - date_start).days + 1)
     ]
-    run_dates = [output.timestamp.date() for output in outputs]
+    run_dates = {timestamp.date() for timestamp in timestamps}
     missing_dates = [date for date in date_range if date not in run_dates]
     print(f"Total missing dates: {len(missing_dates)}")
     missing_outputs = []
     for missing_date in missing_dates:
         missing_timestamp = dt.datetime.combine(missing_date, dt.time.min)
-        source = min(outputs, key=lambda x, ts=missing_timestamp: abs(x.timestamp - ts))
+        # closest run is either the last one before or the first one after
+        i = bisect_left(timestamps, missing_timestamp)
+        if i == len(timestamps) or (
+            i > 0
+            and missing_timestamp - timestamps[i - 1]
+            <= timestamps[i] - missing_timestamp
+        ):
+            i -= 1
+        source = outputs[i]
         print(f"missing date: {missing_date}, filled from source: {source.timestamp}")
         missing_output = MissingOutput(missing_date, source)
         missing_outputs.append(missing_output)
@@ -141,10 +215,16 @@ def prompt_proceed():
 
 
 def fill_missing_data(missing_outputs: List[MissingOutput], path: Path):
-    """Fill missing data by copying files from the source timestamp to the missing date."""
+    """
+    Fill missing data by copying files from the source timestamp to the missing date.
+
+    Copying is I/O-bound (and shutil.copyfile uses sendfile where available),
+    so missing outputs are filled in parallel using a thread pool.
+    """
 
-    for missing_output in missing_outputs:
-        missing_output.fill(path)
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        # consume results to re-raise errors from worker threads
+        list(executor.map(MissingOutput.fill, missing_outputs, repeat(path)))
 
 
 def main():